@@ -0,0 +1,236 @@
+import os
+import io
+import sys
+import json
+import glob
+import time
+import platform
+import argparse
+import subprocess
+import tempfile
+import tracemalloc
+import contextlib
+from tagger import Tokenizer, Emission, Transition, Tagger
+from train import extract_sentences, new_counts, add_sentences, write_model_files
+
+
+def best_time(function, repeats):
+    """Runs the function several times and returns the shortest wall time and the last result."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def peak_memory(function):
+    """Returns the peak memory (in MB) allocated while running the function."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def metric(value, unit, higher_is_better):
+    return {"value": round(value, 4), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def load_texts(filenames, scale):
+    """Reads the sentences of the testing files, repeated scale times to get a synthetic larger corpus."""
+    texts = []
+    for filename in filenames:
+        with open(filename) as json_file:
+            texts.extend(sentence['srn'] for sentence in json.load(json_file)['content'])
+    return texts * scale
+
+
+def benchmark_tagging(data_folder, texts, repeats, beam=None, top_k=None):
+    """Measures the model load time and the throughput of every stage of the tagger. If a beam or top_k is given, also measures the pruned decoder and how often it differs from the exact one."""
+    results = {}
+    postag_dist = data_folder + "postag_distribution.json"
+    emission_prob = data_folder + "emission_probabilities.json"
+    transition_prob = data_folder + "transition_probabilities.json"
+    model_file = data_folder + "model.bin"
+
+    # the json files and the vocabulary of the binary model are loaded on first use, so they are touched here to measure the whole load
+    # файлы json и словарь двоичной модели загружаются при первом использовании, поэтому здесь к ним обращаются, чтобы измерить всю загрузку
+    def load_json():
+        emission, transition = Emission(postag_dist, emission_prob), Transition(transition_prob)
+        emission.emission_prob, transition.log_prob
+        return emission, transition
+
+    def load_binary():
+        tagger = Tagger.from_model(model_file)
+        tagger.emission.emission_prob.rows
+        return tagger
+
+    elapsed, (emission, transition) = best_time(load_json, repeats)
+    results["load_json_ms"] = metric(elapsed * 1000, "ms", False)
+    results["load_json_peak_mb"] = metric(peak_memory(load_json), "MB", False)
+    if os.path.exists(model_file):
+        elapsed, _ = best_time(load_binary, repeats)
+        results["load_binary_ms"] = metric(elapsed * 1000, "ms", False)
+        results["load_binary_peak_mb"] = metric(peak_memory(load_binary), "MB", False)
+
+    tokenizer = Tokenizer()
+    elapsed, sentences = best_time(lambda: [sentence for text in texts for sentence in tokenizer.tokenize(text)], repeats)
+    total_tokens = sum(len(sentence) for sentence in sentences)
+    results["tokenizer_tokens_per_s"] = metric(total_tokens / elapsed, "tokens/s", True)
+
+    # the cache of the emission lookups is emptied before every run, so every run starts cold
+    # кэш перед каждым запуском очищается, чтобы каждый запуск начинался с нуля
+    def emission_run():
+        emission.cache_clear()
+        return [emission.get_emission_probabilities(sentence) for sentence in sentences]
+    elapsed, tagged_sentences = best_time(emission_run, repeats)
+    results["emission_tokens_per_s"] = metric(total_tokens / elapsed, "tokens/s", True)
+
+    elapsed, _ = best_time(lambda: [transition.get_sequence(tagged_tokens) for tagged_tokens in tagged_sentences], repeats)
+    results["decoder_tokens_per_s"] = metric(total_tokens / elapsed, "tokens/s", True)
+    elapsed, exact_sequences = best_time(lambda: transition.get_sequences(tagged_sentences), repeats)
+    results["batch_decoder_tokens_per_s"] = metric(total_tokens / elapsed, "tokens/s", True)
+    # the splitting of the lattices at anchors is off by default, so it is measured separately to compare with the batched decoder
+    # разделение решеток по опорным словам по умолчанию выключено, поэтому оно измеряется отдельно для сравнения с пакетным декодером
+    elapsed, _ = best_time(lambda: transition.get_sequences(tagged_sentences, anchors=True), repeats)
+    results["anchored_batch_decoder_tokens_per_s"] = metric(total_tokens / elapsed, "tokens/s", True)
+    elapsed, _ = best_time(lambda: transition.get_posteriors(tagged_sentences), repeats)
+    results["posteriors_tokens_per_s"] = metric(total_tokens / elapsed, "tokens/s", True)
+    if beam is not None or top_k is not None:
+        elapsed, pruned_sequences = best_time(lambda: transition.get_sequences(tagged_sentences, beam=beam, top_k=top_k), repeats)
+        results["pruned_batch_decoder_tokens_per_s"] = metric(total_tokens / elapsed, "tokens/s", True)
+        differing = sum(exact != pruned for exact, pruned in zip(exact_sequences, pruned_sequences))
+        results["pruned_differing_sentences_pct"] = metric(100 * differing / max(len(exact_sequences), 1), "%", False)
+    results["tagging_peak_mb"] = metric(peak_memory(lambda: transition.get_sequences([emission.get_emission_probabilities(sentence) for sentence in sentences])), "MB", False)
+    return results, total_tokens
+
+
+def benchmark_startup(data_folder, repeats):
+    """Measures the wall time of fresh interpreters that import the modules or tag a single sentence, which is what a command line call costs."""
+    results = {}
+    working_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def run(*arguments):
+        subprocess.run([sys.executable] + list(arguments), cwd=working_folder, check=True, stdout=subprocess.DEVNULL)
+
+    for module in ["tagger", "tag", "train", "test"]:
+        elapsed, _ = best_time(lambda: run("-c", "import {}".format(module)), repeats)
+        results["import_{}_ms".format(module)] = metric(elapsed * 1000, "ms", False)
+
+    with tempfile.TemporaryDirectory() as folder:
+        sentence_file = folder + "/sentence.txt"
+        with open(sentence_file, "w") as outfile:
+            outfile.write("Mi lobi yu.\n")
+        if os.path.exists(data_folder + "model.bin"):
+            elapsed, _ = best_time(lambda: run("tag.py", sentence_file, "-j", "1", "-r", data_folder), repeats)
+            results["tag_sentence_binary_ms"] = metric(elapsed * 1000, "ms", False)
+        # a copy of the folder without the binary model forces the json files to be loaded
+        # копия папки без бинарной модели заставляет загружать файлы json
+        json_folder = folder + "/data/"
+        os.makedirs(json_folder)
+        for filename in ["postag_distribution.json", "emission_probabilities.json", "transition_probabilities.json"]:
+            with open(data_folder + filename, "rb") as infile, open(json_folder + filename, "wb") as outfile:
+                outfile.write(infile.read())
+        elapsed, _ = best_time(lambda: run("tag.py", sentence_file, "-j", "1", "-r", json_folder), repeats)
+        results["tag_sentence_json_ms"] = metric(elapsed * 1000, "ms", False)
+    return results
+
+
+def benchmark_training(dataset_files, scales, repeats):
+    """Measures the training wall time for the bundled datasets repeated several times."""
+    results = {}
+    word_postag_pairs = []
+    for filename in dataset_files:
+        with open(filename) as json_file:
+            word_postag_pairs.extend(extract_sentences(json.load(json_file)))
+
+    def train(sentences, data_folder):
+        counts = new_counts()
+        add_sentences(counts, sentences)
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_model_files(counts, data_folder)
+
+    with tempfile.TemporaryDirectory() as data_folder:
+        for scale in scales:
+            sentences = word_postag_pairs * scale
+            elapsed, _ = best_time(lambda: train(sentences, data_folder + "/"), repeats)
+            results["training_s_x{}".format(scale)] = metric(elapsed, "s", False)
+            results["training_sentences_per_s_x{}".format(scale)] = metric(len(sentences) / elapsed, "sentences/s", True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns the metrics that are worse than in the baseline by more than the threshold (a proportion)."""
+    regressions = []
+    for name, current in results["metrics"].items():
+        if name not in baseline["metrics"]:
+            continue
+        previous = baseline["metrics"][name]["value"]
+        if previous == 0:
+            continue
+        change = (current["value"] - previous) / previous
+        if current["higher_is_better"]:
+            change = -change
+        if change > threshold:
+            regressions.append((name, previous, current["value"], change))
+    return regressions
+
+
+if __name__ == "__main__":
+    # input command
+    # анализ входной команды
+    parser = argparse.ArgumentParser(description="Benchmark of the tokenizer, the emission and transition probabilities and the training script")
+    parser.add_argument("-r", default=None, type=str, dest="readFrom", help="Full path to the folder that contains the statistical data obtained from the training set (it looks into /data if the folder is not specified)")
+    parser.add_argument("-w", default="benchmark.json", type=str, dest="writeTo", help="Full path to the json file to save the results (benchmark.json by default)")
+    parser.add_argument("-b", default=None, type=str, dest="baseline", help="Full path to a json file with the results of a previous run to compare with")
+    parser.add_argument("-t", default=0.2, type=float, dest="threshold", help="Proportion by which a metric has to be worse than in the baseline to be reported as a regression (0.2 by default)")
+    parser.add_argument("-s", default=[1, 2, 4], type=int, nargs="+", dest="scales", help="How many times the corpora are repeated to get larger synthetic corpora (1 2 4 by default)")
+    parser.add_argument("-n", default=3, type=int, dest="repeats", help="Number of runs of every measure; the fastest one is reported")
+    parser.add_argument("--beam", default=None, type=int, dest="beam", help="Beam width of the pruned decoder to compare with the exact one")
+    parser.add_argument("--top-k", default=None, type=int, dest="topK", help="Number of candidate tags per word of the pruned decoder to compare with the exact one")
+    args = parser.parse_args()
+
+    working_folder = "{}".format(os.getcwd())
+    data_folder = working_folder + "/data/" if args.readFrom == None else "{}".format(args.readFrom)
+    if not os.path.exists(data_folder):
+        raise ValueError("The specified path to the folder containing the statistical data does not exists.")
+    testing_files = sorted(glob.glob(working_folder + "/testing/test_text*.json"))
+    dataset_files = sorted(glob.glob(working_folder + "/datasets/*.json"))
+
+    results = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "corpus_tokens": {},
+        "metrics": {},
+    }
+    for scale in args.scales:
+        print("Tagging the testing texts x{}...".format(scale))
+        metrics, total_tokens = benchmark_tagging(data_folder, load_texts(testing_files, scale), args.repeats, args.beam, args.topK)
+        results["corpus_tokens"]["x{}".format(scale)] = total_tokens
+        for name, value in metrics.items():
+            results["metrics"]["{}_x{}".format(name, scale)] = value
+    print("Starting the scripts...")
+    results["metrics"].update(benchmark_startup(data_folder, args.repeats))
+    print("Training on the datasets...")
+    results["metrics"].update(benchmark_training(dataset_files, args.scales, args.repeats))
+
+    for name, value in results["metrics"].items():
+        print("{:<40} {:>14} {}".format(name, value["value"], value["unit"]))
+    with open(args.writeTo, "w") as outfile:
+        json.dump(results, outfile, indent=4)
+    print("Benchmark results saved to file: {}".format(args.writeTo))
+
+    # comparison with a stored baseline // сравнение с сохраненными результатами
+    if args.baseline != None:
+        with open(args.baseline) as json_file:
+            baseline = json.load(json_file)
+        regressions = compare(results, baseline, args.threshold)
+        for name, previous, current, change in regressions:
+            print("REGRESSION {}: {} -> {} ({:.0%} worse)".format(name, previous, current, change))
+        if regressions:
+            sys.exit(1)
+        print("No regressions against {}".format(args.baseline))
@@ -0,0 +1,84 @@
+import json
+import sqlite3
+import hashlib
+
+# version of the cached results; it is part of the fingerprint, so the results of older versions of the tagger are discarded
+# версия кэшированных результатов; она входит в отпечаток, поэтому результаты старых версий теггера отбрасываются
+CACHE_VERSION = 1
+# marks the sentences that are not in the cache (None cannot be used, because False is a valid result)
+# отмечает предложения, которых нет в кэше (None использовать нельзя, так как False - допустимый результат)
+MISSING = object()
+# maximum number of keys per query, below the limit of variables of sqlite
+# максимальное число ключей в запросе, ниже предела переменных sqlite
+QUERY_SIZE = 500
+
+
+def file_fingerprint(filenames):
+    """Returns a hash of the contents of the files, which changes whenever a new model is trained."""
+    digest = hashlib.sha256()
+    for filename in filenames:
+        with open(filename, "rb") as infile:
+            for block in iter(lambda: infile.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """A persistent cache of tagged sentences in a sqlite file. The key of a sentence is a hash of its tokens and of the settings (metric, pruning, output) used to tag it.
+    The cache is emptied when it is opened with the fingerprint of another model, and the least recently used sentences are evicted when it holds more than max_entries."""
+    def __init__(self, filename, fingerprint, settings="", max_entries=1000000):
+        self.max_entries = max_entries
+        self.settings = settings.encode("utf-8")
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, result TEXT, used INTEGER)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+            fingerprint = "{}:{}".format(CACHE_VERSION, fingerprint)
+            row = self.connection.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+            if row is None or row[0] != fingerprint:
+                # a new model was trained, so none of the cached results are valid anymore
+                # была обучена новая модель, поэтому ни один кэшированный результат больше не действителен
+                self.connection.execute("DELETE FROM entries")
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        self.size = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self.clock = self.connection.execute("SELECT COALESCE(MAX(used), 0) FROM entries").fetchone()[0]
+
+    def key(self, sentence):
+        """Returns the key of a tokenized sentence."""
+        digest = hashlib.sha256(self.settings)
+        digest.update(b"\0")
+        digest.update(json.dumps(sentence, ensure_ascii=False).encode("utf-8"))
+        return digest.digest()[:16]
+
+    def get_many(self, sentences):
+        """Returns the cached result of every sentence, or MISSING for the sentences that are not in the cache."""
+        keys = [self.key(sentence) for sentence in sentences]
+        found = {}
+        for start in range(0, len(keys), QUERY_SIZE):
+            batch = keys[start:start + QUERY_SIZE]
+            query = "SELECT key, result FROM entries WHERE key IN ({})".format(",".join("?" * len(batch)))
+            found.update(self.connection.execute(query, batch).fetchall())
+        if found:
+            self.clock += 1
+            with self.connection:
+                self.connection.executemany("UPDATE entries SET used = ? WHERE key = ?", [(self.clock, key) for key in found])
+        return [json.loads(found[key]) if key in found else MISSING for key in keys]
+
+    def put_many(self, sentences, results):
+        """Stores the results of the sentences and evicts the least recently used ones if the cache is full."""
+        self.clock += 1
+        with self.connection:
+            cursor = self.connection.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?)", [(self.key(sentence), json.dumps(result, ensure_ascii=False), self.clock) for sentence, result in zip(sentences, results)])
+            self.size += cursor.rowcount
+            if self.size > self.max_entries:
+                # a tenth of the cache is evicted at once, so the eviction does not run after every chunk
+                # за один раз вытесняется десятая часть кэша, чтобы вытеснение не выполнялось после каждого фрагмента
+                excess = self.size - self.max_entries + self.max_entries // 10
+                self.connection.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used LIMIT ?)", (excess,))
+                self.size = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import threading
+from tagger import load_tagger, model_files
+
+# text tagged by every model before it is used, so a broken or half-written model is rejected before it serves any request
+# текст, который размечает каждая модель перед использованием, чтобы поврежденная или недописанная модель отклонялась до первого запроса
+PROBE_TEXT = "Mi lobi yu. A pikin e waka go na skoro."
+
+
+def load_copied_tagger(data_folder):
+    """Loads the tagger of a model folder with the binary model read into memory instead of mapped, so a model file overwritten in place cannot break the tagger that is serving."""
+    return load_tagger(data_folder, mapped=False)
+
+
+class ModelHandle(object):
+    """Holds the tagger of a model folder and replaces it when a new model is trained there, without restarting the process.
+    A background thread checks the modification time and size of the model files every interval seconds; a new model is loaded and validated in that thread and swapped in with a single assignment, so the batches that already took the old tagger finish with it.
+    The binary model is read into memory by default instead of mapped, so the files can be overwritten in place while the model is in use."""
+    def __init__(self, data_folder, interval=2.0, settle=0.5, stats=None, loader=load_copied_tagger):
+        self.data_folder = data_folder
+        self.interval = interval
+        self.settle = settle  # seconds the files must stay unchanged before they are loaded // сколько секунд файлы должны оставаться неизменными перед загрузкой
+        self.stats = stats
+        self.loader = loader
+        self.error = None  # error of the last failed reload // ошибка последней неудачной перезагрузки
+        self.stamp = self.__stamp()
+        self.tagger = self.__load()
+        self.version = 1
+        self.loaded = time.time()
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+        if interval:
+            self.__thread = threading.Thread(target=self.__watch, name="model-reload", daemon=True)
+            self.__thread.start()
+
+    @classmethod
+    def from_tagger(cls, tagger):
+        """Wraps a tagger that is never reloaded, for the code that expects a handle."""
+        handle = cls.__new__(cls)
+        handle.data_folder = None
+        handle.interval = 0
+        handle.stats = tagger.stats
+        handle.error = None
+        handle.stamp = None
+        handle.tagger = tagger
+        handle.version = 1
+        handle.loaded = time.time()
+        handle.__lock = threading.Lock()
+        handle.__stop = threading.Event()
+        handle.__thread = None
+        return handle
+
+    def __stamp(self):
+        """A helper method that returns the names, modification times and sizes of the model files, or None if some of them is missing."""
+        try:
+            return tuple((filename, os.stat(filename).st_mtime_ns, os.stat(filename).st_size) for filename in model_files(self.data_folder))
+        except FileNotFoundError:
+            return None
+
+    def __load(self):
+        """A helper method that loads the tagger and tags the probe text with it. The probe also reads the json files and the vocabulary, which are otherwise loaded on first use."""
+        tagger = self.loader(self.data_folder)
+        tagged_sentences = tagger.tag(PROBE_TEXT)
+        if not tagged_sentences or any(tagged_sentence is False for tagged_sentence in tagged_sentences):
+            raise ValueError("The model in {} could not tag the probe text.".format(self.data_folder))
+        if self.stats is not None:
+            tagger.instrument(self.stats)
+        return tagger
+
+    def check(self):
+        """Loads the model again if its files changed and swaps it in once it is loaded and validated. Returns whether a new model was swapped in; if it fails, the current model is kept and the error is stored in error."""
+        if self.data_folder is None:
+            return False
+        with self.__lock:
+            stamp = self.__stamp()
+            if stamp is None or stamp == self.stamp:
+                return False
+            # a model that is still being written changes during the settle time and is checked again later
+            # модель, которая еще записывается, меняется за время ожидания и проверяется позже
+            time.sleep(self.settle)
+            if self.__stamp() != stamp:
+                return False
+            try:
+                tagger = self.__load()
+            except Exception as error:
+                # the same files are not loaded again until they change
+                # те же файлы не загружаются снова, пока они не изменятся
+                self.stamp = stamp
+                self.error = "{}: {}".format(type(error).__name__, error)
+                if self.stats is not None:
+                    self.stats.count("model_reload_failures")
+                print("The new model in {} was not loaded: {}".format(self.data_folder, self.error), file=sys.stderr)
+                return False
+            self.tagger = tagger
+            self.stamp = stamp
+            self.version += 1
+            self.loaded = time.time()
+            self.error = None
+            if self.stats is not None:
+                self.stats.count("model_reloads")
+            return True
+
+    def __watch(self):
+        while not self.__stop.wait(self.interval):
+            self.check()
+
+    def close(self):
+        """Stops watching the model folder."""
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
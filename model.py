@@ -0,0 +1,498 @@
+import os
+import argparse
+import json
+import struct
+import numpy as np
+
+# Binary model format / двоичный формат модели
+#
+# magic (8 bytes) | version (uint32) | header length (uint32) | header (json) | sections
+#
+# The header describes the tag index, the part-of-speech distribution and the offset, type and shape of every section.
+# Sections are aligned to 64 bytes so they can be opened with np.memmap and shared between processes.
+# Заголовок описывает индекс тегов, распределение частей речи и смещение, тип и размер каждой секции.
+MODEL_MAGIC = b"SRNHMM\x00\x00"
+MODEL_VERSION = 1
+QUANTIZED_MODEL_VERSION = 2  # quantized models get another version, so older readers refuse them // квантованные модели получают другую версию, чтобы старые версии их не открывали
+ALIGNMENT = 64
+
+# Quantized models / квантованные модели
+#
+# The probability tables can be stored as float16 or uint8 log-probabilities. The uint8 codes are spread evenly between the smallest and the largest finite log-probability of every table
+# (the scale, kept in the header) and ZERO_CODE marks the zero probabilities. The value of every section is whether it holds log-probabilities or probabilities.
+# Таблицы вероятностей могут храниться как логарифмы вероятностей float16 или uint8. Коды uint8 равномерно распределены между наименьшим и наибольшим конечным логарифмом каждой таблицы.
+QUANTIZATION_PRECISIONS = ["float16", "uint8"]
+QUANTIZED_SECTIONS = {"transition": True, "transition_unigrams": False, "transition_bigrams": False, "transition_trigram_data": False, "emission_data": False}
+ZERO_CODE = 255
+
+# approximate size in bytes of the rows of transition log-probabilities that a sparse model keeps for the (u, v) pairs already looked up
+# приблизительный размер в байтах строк логарифмов вероятностей переходов, которые разреженная модель хранит для уже найденных пар (u, v)
+TRANSITION_CACHE_SIZE = 16 * 2 ** 20
+
+# the suffixes and shapes of the rare word-forms model the unknown words; only word-forms seen at most SUFFIX_MAX_FREQUENCY times are counted
+# суффиксы и формы редких словоформ моделируют неизвестные слова; учитываются только словоформы, встреченные не более SUFFIX_MAX_FREQUENCY раз
+SUFFIX_MAX_LENGTH = 4
+SUFFIX_MAX_FREQUENCY = 10
+
+
+def transition_log_probabilities(transition_prob, tag_index, dtype="float64"):
+    """Converts the dense transition probabilities ({t: {"u_v": probability}} for every combination of tags) into a dense [u, v, t] array of log-probabilities indexed by tag ids."""
+    probabilities = np.zeros((len(tag_index),) * 3, dtype=dtype)
+    for t, transitions in transition_prob.items():
+        for u_v, probability in transitions.items():
+            u, v = u_v.split("_", 1)
+            probabilities[tag_index[u], tag_index[v], tag_index[t]] = probability
+    with np.errstate(divide="ignore"):
+        return np.log(probabilities)
+
+
+def transition_tags(transition_prob):
+    """Returns the set of tags found in the transition probabilities, either dense or sparse."""
+    tags = set()
+    if "trigrams" in transition_prob:
+        tags.update(transition_prob["unigrams"].keys())
+        for t, transitions in transition_prob["bigrams"].items():
+            tags.add(t)
+            tags.update(transitions.keys())
+        transition_prob = transition_prob["trigrams"]
+    for t, transitions in transition_prob.items():
+        tags.add(t)
+        for u_v in transitions.keys():
+            tags.update(u_v.split("_", 1))
+    return tags
+
+
+def transition_sections(transition_prob, tag_index, dtype="float64"):
+    """Converts the transition probabilities into the arrays of the model. The dense ones (the old json files) become the [u, v, t] array of log-probabilities.
+    The sparse ones ({"lambdas": [l1, l2, l3], "unigrams": {t: p}, "bigrams": {t: {"v": p}}, "trigrams": {t: {"u_v": p}}} with only the observed n-grams) are kept sparse: the unigram vector, the [v, t] bigram matrix and the sorted keys ((u * tags + v) * tags + t) and probabilities of the observed trigrams."""
+    if "trigrams" not in transition_prob:
+        return {"transition": transition_log_probabilities(transition_prob, tag_index, dtype)}
+    size = len(tag_index)
+    unigrams = np.zeros(size, dtype=dtype)
+    for t, probability in transition_prob["unigrams"].items():
+        unigrams[tag_index[t]] = probability
+    bigrams = np.zeros((size, size), dtype=dtype)
+    for t, transitions in transition_prob["bigrams"].items():
+        for v, probability in transitions.items():
+            bigrams[tag_index[v], tag_index[t]] = probability
+    keys = []
+    data = []
+    for t, transitions in transition_prob["trigrams"].items():
+        for u_v, probability in transitions.items():
+            u, v = u_v.split("_", 1)
+            keys.append((tag_index[u] * size + tag_index[v]) * size + tag_index[t])
+            data.append(probability)
+    order = np.argsort(keys)
+    return {
+        "transition_lambdas": np.array(transition_prob["lambdas"], dtype="float64"),
+        "transition_unigrams": unigrams,
+        "transition_bigrams": bigrams,
+        "transition_trigram_keys": np.array(keys, dtype="int64")[order],
+        "transition_trigram_data": np.array(data, dtype=dtype)[order],
+    }
+
+
+def transition_table(sections):
+    """Returns the object that the decoder indexes with [u, v, t] arrays of tag ids to get the transition log-probabilities: the dense array (or its QuantizedTable) or, for sparse models, an InterpolatedTransitions."""
+    if "transition" in sections:
+        return model_table(sections, "transition")
+    # the rows of a quantized model are kept as float16 log-probabilities, which are still more precise than its uint8 codes
+    # строки квантованной модели хранятся как логарифмы вероятностей float16, которые все равно точнее ее кодов uint8
+    dtype = "float64" if "quantization" not in sections else "float16"
+    return InterpolatedTransitions(sections["transition_lambdas"], model_table(sections, "transition_unigrams"), model_table(sections, "transition_bigrams"), sections["transition_trigram_keys"], model_table(sections, "transition_trigram_data"), dtype=dtype)
+
+
+def word_shape(word):
+    """Returns the shape of a (lower-cased) word-form: whether it is hyphenated or contains an apostrophe.
+    The training counts are of lower-cased forms, so the casing is not part of the shape; it selects the candidate tags (proper names) instead."""
+    features = [name for name, present in (("hyphen", "-" in word), ("apostrophe", "'" in word or "’" in word)) if present]
+    return "+".join(features) if features else "plain"
+
+
+def build_suffix_index(postag_dist, emission_prob, max_length=SUFFIX_MAX_LENGTH, max_frequency=SUFFIX_MAX_FREQUENCY):
+    """Counts the tags of the suffixes (up to max_length characters, always shorter than the word) and of the shapes of the rare word-forms.
+    The counts of every word-form are recovered from its emission probabilities and the part-of-speech distribution."""
+    suffixes = {}
+    shapes = {}
+    for word, postags in emission_prob.items():
+        counts = {tag: round(probability * postag_dist.get(tag, 0)) for tag, probability in postags.items()}
+        if sum(counts.values()) > max_frequency:
+            continue
+        entries = [suffixes.setdefault(word[-length:], {}) for length in range(1, min(max_length, len(word) - 1) + 1)]
+        # the tokenizer splits the digits off as numbers, so the forms with digits are never looked up as words and have no shape
+        # токенизатор отделяет цифры как числа, поэтому формы с цифрами никогда не ищутся как слова и не имеют формы
+        if not any(character.isdigit() for character in word):
+            entries.append(shapes.setdefault(word_shape(word), {}))
+        for entry in entries:
+            for tag, count in counts.items():
+                if count > 0:
+                    entry[tag] = entry.get(tag, 0) + count
+    return {"max_length": max_length, "suffixes": suffixes, "shapes": shapes}
+
+
+def csr_rows(rows, tag_index):
+    """Converts a mapping from keys to {tag: value} into the sorted keys and the arrays of a sparse (CSR) matrix."""
+    keys = sorted(rows.keys())
+    indptr = np.zeros(len(keys) + 1, dtype="int64")
+    indices = []
+    data = []
+    for i, key in enumerate(keys):
+        for tag, value in sorted(rows[key].items()):
+            indices.append(tag_index[tag])
+            data.append(value)
+        indptr[i + 1] = len(indices)
+    return keys, indptr, np.array(indices, dtype="int32"), np.array(data, dtype="float32")
+
+
+def build_model(postag_dist, emission_prob, transition_prob):
+    """Converts the data obtained from the training set (with the same structure as the json files) into the arrays of the binary model."""
+    tags = set(postag_dist.keys()) | transition_tags(transition_prob)
+    for postags in emission_prob.values():
+        tags.update(postags.keys())
+    tags = sorted(tags)
+    tag_index = {tag: i for i, tag in enumerate(tags)}
+
+    # the transitions as a dense [u, v, t] array of log-probabilities or, for sparse models, as the observed n-grams
+    # переходы в виде плотного массива [u, v, t] логарифмов вероятностей или, для разреженных моделей, в виде наблюдаемых n-грамм
+    transition = transition_sections(transition_prob, tag_index, dtype="float32")
+
+    # emission probabilities of every word-form as the rows of a sparse (CSR) matrix
+    # вероятности результата каждой словоформы в виде строк разреженной (CSR) матрицы
+    vocabulary, emission_indptr, emission_indices, emission_data = csr_rows(emission_prob, tag_index)
+
+    # tag counts of the suffixes and shapes of the rare word-forms, for the unknown words
+    # частоты тегов суффиксов и форм редких словоформ для неизвестных слов
+    suffix_index = build_suffix_index(postag_dist, emission_prob)
+    suffix_vocabulary, suffix_indptr, suffix_indices, suffix_data = csr_rows(suffix_index["suffixes"], tag_index)
+    shape_vocabulary, shape_indptr, shape_indices, shape_data = csr_rows(suffix_index["shapes"], tag_index)
+
+    model = {
+        "tags": tags,
+        "postag_distribution": dict(postag_dist),
+        "suffix_max_length": suffix_index["max_length"],
+        "vocabulary": vocabulary,
+    }
+    model.update(transition)
+    model.update({
+        "emission_indptr": emission_indptr,
+        "emission_indices": emission_indices,
+        "emission_data": emission_data,
+        "suffix_vocabulary": suffix_vocabulary,
+        "suffix_indptr": suffix_indptr,
+        "suffix_indices": suffix_indices,
+        "suffix_data": suffix_data,
+        "shape_vocabulary": shape_vocabulary,
+        "shape_indptr": shape_indptr,
+        "shape_indices": shape_indices,
+        "shape_data": shape_data,
+    })
+    return model
+
+
+def quantize_uint8(log_probabilities):
+    """Converts log-probabilities into uint8 codes. Returns the codes and the scale (the smallest log-probability and the step between codes)."""
+    finite = np.isfinite(log_probabilities)
+    low = float(log_probabilities[finite].min()) if finite.any() else 0.0
+    high = float(log_probabilities[finite].max()) if finite.any() else 0.0
+    step = (high - low) / (ZERO_CODE - 1) if high > low else 1.0
+    codes = np.full(log_probabilities.shape, ZERO_CODE, dtype="uint8")
+    codes[finite] = np.rint((log_probabilities[finite] - low) / step)
+    return codes, [low, step]
+
+
+def quantize_model(model, precision):
+    """Returns a copy of a model (created by build_model or opened by read_model) with its probability tables stored as float16 or uint8 log-probabilities.
+    The tag ids of the emission rows and the keys of the trigrams are also stored in the smallest integer type that holds them."""
+    if precision not in QUANTIZATION_PRECISIONS:
+        raise ValueError("Unknown precision {}. Use one of: {}.".format(precision, ", ".join(QUANTIZATION_PRECISIONS)))
+    if "quantization" in model:
+        raise ValueError("The model is already quantized to {}.".format(model["quantization"]["precision"]))
+    quantized = dict(model)
+    sections = []
+    scales = {}
+    for name, log_space in QUANTIZED_SECTIONS.items():
+        if name not in model:
+            continue
+        values = np.asarray(model[name], dtype="float64")
+        if not log_space:
+            with np.errstate(divide="ignore"):
+                values = np.log(values)
+        if precision == "float16":
+            quantized[name] = values.astype("float16")
+        else:
+            quantized[name], scales[name] = quantize_uint8(values)
+        sections.append(name)
+    if len(model["tags"]) <= 256:
+        for name in ["emission_indices", "suffix_indices", "shape_indices"]:
+            if name in model:
+                quantized[name] = model[name].astype("uint8")
+    if "transition_trigram_keys" in model and len(model["tags"]) ** 3 < 2 ** 31:
+        quantized["transition_trigram_keys"] = model["transition_trigram_keys"].astype("int32")
+    quantized["quantization"] = {"precision": precision, "sections": sections, "scales": scales}
+    return quantized
+
+
+def write_model(filename, model):
+    """Saves a model created by build_model into a single binary file."""
+    # the lists of keys (word-forms, suffixes, shapes) are saved as text with one key per line
+    # списки ключей (словоформы, суффиксы, формы) сохраняются как текст, по одному ключу в строке
+    sections = {}
+    for name, value in model.items():
+        if name.endswith("vocabulary"):
+            sections[name] = np.frombuffer("\n".join(value).encode("utf-8"), dtype="uint8")
+        elif isinstance(value, np.ndarray):
+            sections[name] = value
+    header = {
+        "tags": model["tags"],
+        "postag_distribution": model["postag_distribution"],
+        "sections": {},
+    }
+    if "suffix_max_length" in model:
+        header["suffix_max_length"] = model["suffix_max_length"]
+    if "quantization" in model:
+        header["quantization"] = model["quantization"]
+    # the offsets depend on the size of the header, so it is serialized until its length no longer changes
+    # смещения зависят от размера заголовка, поэтому он сериализуется, пока его длина не перестанет меняться
+    header_bytes = b""
+    while True:
+        offset = len(MODEL_MAGIC) + 8 + len(header_bytes)
+        for name, array in sections.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            header["sections"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            offset += array.nbytes
+        new_header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+        if len(new_header_bytes) == len(header_bytes):
+            break
+        header_bytes = new_header_bytes
+    # the model is written to a temporary file that then replaces the old one, so the processes that have the old file mapped keep reading it unchanged
+    # модель записывается во временный файл, который затем заменяет старый, поэтому процессы, отобразившие старый файл, продолжают читать его без изменений
+    temporary_filename = "{}.{}.tmp".format(filename, os.getpid())
+    with open(temporary_filename, "wb") as outfile:
+        outfile.write(MODEL_MAGIC)
+        outfile.write(struct.pack("<II", QUANTIZED_MODEL_VERSION if "quantization" in model else MODEL_VERSION, len(header_bytes)))
+        outfile.write(header_bytes)
+        for name, array in sections.items():
+            outfile.write(b"\x00" * (header["sections"][name]["offset"] - outfile.tell()))
+            outfile.write(np.ascontiguousarray(array).tobytes())
+    os.replace(temporary_filename, filename)
+
+
+def read_model(filename, mapped=True):
+    """Opens a binary model file. The arrays are memory-mapped, so the pages are loaded on demand and shared between processes.
+    If mapped is False, the file is read into memory instead, so the model does not depend on the file after it is opened (a mapped file that is overwritten in place kills the process with SIGBUS)."""
+    with open(filename, "rb") as infile:
+        magic = infile.read(len(MODEL_MAGIC))
+        if magic != MODEL_MAGIC:
+            raise ValueError("The file {} is not a binary part-of-speech model.".format(filename))
+        version, header_length = struct.unpack("<II", infile.read(8))
+        if version not in (MODEL_VERSION, QUANTIZED_MODEL_VERSION):
+            raise ValueError("The binary model {} has version {}, but only versions {} and {} are supported.".format(filename, version, MODEL_VERSION, QUANTIZED_MODEL_VERSION))
+        header = json.loads(infile.read(header_length).decode("utf-8"))
+        if not mapped:
+            infile.seek(0)
+            data = np.frombuffer(infile.read(), dtype="uint8")
+    model = {
+        "tags": header["tags"],
+        "postag_distribution": header["postag_distribution"],
+    }
+    if "suffix_max_length" in header:
+        model["suffix_max_length"] = header["suffix_max_length"]
+    if "quantization" in header:
+        model["quantization"] = header["quantization"]
+    # the file is mapped once and every section is a view of the map; plain array views avoid the overhead of the memmap subclass on every indexing
+    # файл отображается один раз, и каждая секция является представлением отображения; обычные представления избегают накладных расходов подкласса memmap
+    if mapped:
+        data = np.memmap(filename, dtype="uint8", mode="r").view(np.ndarray)
+    for name, section in header["sections"].items():
+        dtype = np.dtype(section["dtype"])
+        shape = tuple(section["shape"])
+        size = int(np.prod(shape)) * dtype.itemsize
+        if size == 0:
+            model[name] = np.zeros(shape, dtype=dtype)
+        else:
+            if section["offset"] + size > len(data):
+                raise ValueError("The binary model {} is truncated.".format(filename))
+            model[name] = data[section["offset"]:section["offset"] + size].view(dtype).reshape(shape)
+    for name in [name for name in model if name.endswith("vocabulary")]:
+        vocabulary = bytes(model[name]).decode("utf-8")
+        model[name] = vocabulary.split("\n") if vocabulary else []
+    return model
+
+
+def model_table(model, name):
+    """Returns a section of a model as the decoder reads it: the array itself or, if the section is quantized, a QuantizedTable over its codes."""
+    quantization = model.get("quantization")
+    if quantization is None or name not in quantization["sections"]:
+        return model[name]
+    return QuantizedTable(model[name], quantization["scales"].get(name), QUANTIZED_SECTIONS[name])
+
+
+class QuantizedTable(object):
+    """A quantized section indexed like the array it replaces. Only the elements that are looked up are converted back to float64 (log-probabilities, or probabilities if log_space is False), so the table itself stays in its compact type."""
+    def __init__(self, codes, scale=None, log_space=True):
+        self.codes = codes
+        self.scale = scale  # smallest log-probability and step of the uint8 codes, None for float16 // наименьший логарифм и шаг кодов uint8, None для float16
+        self.log_space = log_space
+        self.shape = codes.shape
+
+    def __getitem__(self, index):
+        codes = self.codes[index]
+        if self.scale is None:
+            values = codes.astype("float64")
+        else:
+            values = np.where(codes == ZERO_CODE, -np.inf, self.scale[0] + codes * self.scale[1])
+        if not self.log_space:
+            values = np.exp(values)
+        return values
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class CsrRows(object):
+    """A read-only mapping from keys to {tag: value} dictionaries that reads the rows of a CSR matrix on demand."""
+    def __init__(self, tags, keys, indptr, indices, data):
+        self.tags = tags
+        self.keys_list = keys
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    def __getattr__(self, name):
+        # the index of the keys is built on first use, so models are opened without reading all their keys
+        # индекс ключей строится при первом использовании, поэтому модели открываются без чтения всех ключей
+        if name == "rows":
+            self.rows = {key: i for i, key in enumerate(self.keys_list)}
+            return self.rows
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def __contains__(self, word):
+        return word in self.rows
+
+    def __getitem__(self, word):
+        row = self.rows[word]
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return {self.tags[tag_id]: float(probability) for tag_id, probability in zip(self.indices[start:end].tolist(), self.data[start:end].tolist())}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def keys(self):
+        return self.rows.keys()
+
+    def get(self, word, default=None):
+        return self[word] if word in self.rows else default
+
+    def items(self):
+        return ((key, self[key]) for key in self.rows)
+
+
+class InterpolatedTransitions(object):
+    """The transition log-probabilities of a sparse model, indexed like the dense [u, v, t] array. The log-probabilities of every t after a (u, v) pair add the unigram, bigram and observed trigram probabilities weighted by the lambdas of the deleted interpolation.
+    They are computed the first time the pair is looked up and kept in rows of the given dtype that grow with the pairs used, up to cache_size bytes, so the memory grows with the observed trigrams and the pairs in use instead of the cube of the tag set.
+    The bigram and trigram tables (possibly quantized) are only read for the pairs that are looked up."""
+    def __init__(self, lambdas, unigrams, bigrams, trigram_keys, trigram_data, cache_size=TRANSITION_CACHE_SIZE, dtype="float64"):
+        self.size = len(unigrams)
+        self.shape = (self.size,) * 3
+        # the unigram term is the same for every pair, so it is weighted once
+        # униграммное слагаемое одинаково для всех пар, поэтому оно взвешивается один раз
+        self.unigram_term = lambdas[0] * np.asarray(unigrams[...], dtype="float64")[None, :]
+        self.bigram_weight = lambdas[1]
+        self.bigrams = bigrams
+        self.trigram_keys = trigram_keys
+        self.trigram_weight = lambdas[2]
+        self.trigram_data = trigram_data
+        # row of every (u, v) pair already looked up (-1 if it is not kept) and the rows of log-probabilities, which grow on demand
+        # строка каждой уже найденной пары (u, v) (-1, если она не хранится) и строки логарифмов вероятностей, которые растут по мере надобности
+        self.slots = np.full(self.size * self.size, -1, dtype="int32")
+        self.rows = np.empty((min(64, self.size * self.size), self.size), dtype=dtype)
+        self.used = 0
+        self.max_rows = max(cache_size // max(self.rows.itemsize * self.size, 1), 1)
+
+    def __getitem__(self, index):
+        u, v, t = index
+        pairs = np.asarray(u, dtype=np.intp) * self.size + np.asarray(v, dtype=np.intp)
+        slots = self.slots[pairs]
+        if (slots < 0).any():
+            self.__fill(np.unique(pairs[slots < 0]), pairs)
+            slots = self.slots[pairs]
+        return self.rows[slots, t]
+
+    def __fill(self, missing, pairs):
+        """A helper method that computes and keeps the rows of the missing pairs. When the rows would exceed max_rows, the kept rows are dropped and only the pairs of the current lookup are computed again."""
+        if self.used + len(missing) > self.max_rows:
+            self.slots.fill(-1)
+            self.used = 0
+            missing = np.unique(pairs)
+        end = self.used + len(missing)
+        if end > len(self.rows):
+            # the rows grow by doubling, up to max_rows unless a single lookup needs more
+            # строки растут удвоением до max_rows, если одному поиску не нужно больше
+            rows = np.empty((max(end, min(2 * len(self.rows), self.max_rows)), self.size), dtype=self.rows.dtype)
+            rows[:self.used] = self.rows[:self.used]
+            self.rows = rows
+        with np.errstate(divide="ignore"):
+            self.rows[self.used:end] = np.log(self.__probabilities(missing))
+        self.slots[missing] = np.arange(self.used, end)
+        self.used = end
+
+    def __probabilities(self, pairs):
+        """A helper method that returns the interpolated probabilities of every t after the given (u, v) pairs. The trigrams of a pair have consecutive keys, so they are found with two binary searches per pair."""
+        probabilities = self.unigram_term + self.bigram_weight * np.asarray(self.bigrams[pairs % self.size], dtype="float64")
+        if len(self.trigram_keys):
+            # the bounds are converted to the type of the stored keys, so searchsorted does not convert the whole table
+            # границы приводятся к типу сохраненных ключей, чтобы searchsorted не преобразовывал всю таблицу
+            starts = np.searchsorted(self.trigram_keys, np.asarray(pairs * self.size, dtype=self.trigram_keys.dtype))
+            ends = np.searchsorted(self.trigram_keys, np.asarray((pairs + 1) * self.size, dtype=self.trigram_keys.dtype))
+            counts = ends - starts
+            rows = np.repeat(np.arange(len(pairs)), counts)
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            probabilities[rows, np.asarray(self.trigram_keys[positions], dtype=np.intp) - pairs[rows] * self.size] += self.trigram_weight * self.trigram_data[positions]
+        return probabilities
+
+
+class EmissionRows(CsrRows):
+    """A read-only mapping from word-forms to their emission probabilities."""
+    def __init__(self, model):
+        super().__init__(model["tags"], model["vocabulary"], model["emission_indptr"], model["emission_indices"], model_table(model, "emission_data"))
+
+
+def suffix_index_rows(model):
+    """Returns the suffix index stored in a binary model (with the same structure as build_suffix_index), or None for models saved without it."""
+    if "suffix_vocabulary" not in model:
+        return None
+    return {
+        "max_length": model["suffix_max_length"],
+        "suffixes": CsrRows(model["tags"], model["suffix_vocabulary"], model["suffix_indptr"], model["suffix_indices"], model["suffix_data"]),
+        "shapes": CsrRows(model["tags"], model["shape_vocabulary"], model["shape_indptr"], model["shape_indices"], model["shape_data"]),
+    }
+
+
+if __name__ == "__main__":
+    # converts the json files of an already trained model into the binary format
+    # преобразует файлы json уже обученной модели в двоичный формат
+    parser = argparse.ArgumentParser(description="Converts the json files of a trained model into a binary model file")
+    parser.add_argument("-r", default=None, type=str, dest="readFrom", help="Full path to the folder that contains the json files obtained from the training set (it looks into /data if the folder is not specified)")
+    parser.add_argument("-w", default=None, type=str, dest="writeTo", help="Full path to the binary model file (it saves to model.bin in the same folder if the file is not specified)")
+    parser.add_argument("-q", default=None, choices=QUANTIZATION_PRECISIONS, dest="quantize", help="Stores the probability tables as float16 or uint8 log-probabilities, for a smaller model that uses less memory (full precision by default)")
+    args = parser.parse_args()
+
+    data_folder = os.getcwd() + "/data/" if args.readFrom == None else "{}".format(args.readFrom)
+    if not os.path.exists(data_folder):
+        raise ValueError("The specified path to the folder containing the json files with the statistical data does not exists.")
+    model_file = data_folder + "model.bin" if args.writeTo == None else args.writeTo
+
+    with open(data_folder + "postag_distribution.json") as json_file:
+        postag_dist = json.load(json_file)
+    with open(data_folder + "emission_probabilities.json") as json_file:
+        emission_prob = json.load(json_file)
+    with open(data_folder + "transition_probabilities.json") as json_file:
+        transition_prob = json.load(json_file)
+    model = build_model(postag_dist, emission_prob, transition_prob)
+    if args.quantize != None:
+        model = quantize_model(model, args.quantize)
+    write_model(model_file, model)
+    print("Binary model saved to file: {} ({:.2f} MB)".format(model_file, os.path.getsize(model_file) / 2 ** 20))
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from stats import Stats
+from handle import ModelHandle
+
+# reasons of the HTTP status codes used by the server
+# описания кодов состояния HTTP, используемых сервером
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+def encode_json(response):
+    """Encodes a json answer (the metrics are answered as plain text) as utf-8 bytes."""
+    return json.dumps(response, ensure_ascii=False).encode("utf-8")
+
+
+def tagging_answer(tagged_sentences, time_ms):
+    """Returns the json answer with the tagged sentences of a text, without the new line tokens."""
+    # sentences that could not be disambiguated are answered as null
+    # предложения, которые не удалось разрешить, возвращаются как null
+    sentences = [[(token, postag) for token, postag in tagged_sentence if token != "\n"] if tagged_sentence is not False else None for tagged_sentence in tagged_sentences]
+    return {"sentences": sentences, "time_ms": time_ms}
+
+
+class BatchTagger(object):
+    """Collects the sentences of concurrent requests and tags them together as a single batch. The model is a ModelHandle (or a Tagger that is never reloaded); every batch is tagged by the tagger that the handle holds when the batch starts."""
+    inline_text_size = 4096  # texts up to this number of characters are tokenized directly in the event loop, where it is faster than handing them to a thread // тексты до этого числа символов токенизируются прямо в цикле событий, где это быстрее, чем передавать их потоку
+    def __init__(self, model, max_batch_size=256, max_wait=0.005, max_queue=1024, beam=None, top_k=None):
+        self.handle = model if isinstance(model, ModelHandle) else ModelHandle.from_tagger(model)
+        self.beam = beam
+        self.top_k = top_k
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    async def tag(self, text, metric=None):
+        """Tokenizes the text and waits until its sentences are tagged. Raises asyncio.QueueFull if too many requests are waiting."""
+        if self.queue.full():
+            raise asyncio.QueueFull
+        loop = asyncio.get_running_loop()
+        # a long text is tokenized in a thread, so it does not stall the other connections and the batching timer
+        # длинный текст токенизируется в потоке, чтобы он не задерживал другие соединения и таймер пакетов
+        if len(text) > self.inline_text_size:
+            sentences = await loop.run_in_executor(None, self.handle.tagger.tokenizer.tokenize, text)
+        else:
+            sentences = self.handle.tagger.tokenizer.tokenize(text)
+        if not sentences:
+            return []
+        future = loop.create_future()
+        self.queue.put_nowait((sentences, metric, future))
+        return await future
+
+    async def run(self):
+        """Takes the waiting requests from the queue and tags them in batches until it is cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self.queue.get()]
+            size = len(requests[0][0])
+            # the batch is closed when it is full or when the first request has waited max_wait seconds
+            # пакет закрывается, когда он заполнен или первый запрос ждал max_wait секунд
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                size += len(request[0])
+            # the decoding runs in a thread so the server keeps accepting connections meanwhile
+            # декодирование выполняется в потоке, чтобы сервер продолжал принимать соединения
+            try:
+                results = await loop.run_in_executor(None, self.__tag_requests, requests)
+            except Exception as error:
+                for _, _, future in requests:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, _, future), result in zip(requests, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def __tag_requests(self, requests):
+        # tag_batch takes a single metric, so the requests are grouped by metric
+        # tag_batch принимает одну метрику, поэтому запросы группируются по метрике
+        # (the tagger is taken once, so a model swapped in meanwhile is only used from the next batch)
+        # (теггер берется один раз, поэтому модель, замененная тем временем, используется только со следующего пакета)
+        tagger = self.handle.tagger
+        results = [None] * len(requests)
+        for metric in set(metric for _, metric, _ in requests):
+            positions = [i for i, request in enumerate(requests) if request[1] == metric]
+            sentences = [sentence for i in positions for sentence in requests[i][0]]
+            tagged_sentences = tagger.tag_batch(sentences, metric, self.max_batch_size, self.beam, self.top_k)
+            start = 0
+            for i in positions:
+                end = start + len(requests[i][0])
+                results[i] = tagged_sentences[start:end]
+                start = end
+        return results
+
+
+class TaggingServer(object):
+    """A minimal HTTP/1.1 server that tags the text posted to /tag as json and answers the sentences with their tags."""
+    def __init__(self, batch_tagger, max_body_size=1048576):
+        self.batch_tagger = batch_tagger
+        self.max_body_size = max_body_size
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.__respond(writer, 400, {"error": "Malformed request line."}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                # the length must be a non-negative decimal integer; anything else leaves the end of the body unknown, so the connection is closed
+                # длина должна быть неотрицательным десятичным целым числом; иначе конец тела неизвестен, поэтому соединение закрывается
+                length = headers.get("content-length", "") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await self.__respond(writer, 400, {"error": "Invalid Content-Length {!r}.".format(length)}, False)
+                    break
+                length = int(length)
+                if length > self.max_body_size:
+                    await self.__respond(writer, 413, {"error": "The request body is larger than {} bytes.".format(self.max_body_size)}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, response = await self.__route(method, path, body)
+                await self.__respond(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def __route(self, method, path, body):
+        handle = self.batch_tagger.handle
+        if path == "/health":
+            return 200, {"status": "ok", "queued": self.batch_tagger.queue.qsize(), "model_version": handle.version, "model_loaded": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(handle.loaded)), "model_error": handle.error}
+        if path == "/metrics" and handle.tagger.stats is not None:
+            return 200, handle.tagger.stats.to_prometheus()
+        if path != "/tag":
+            return 404, {"error": "Unknown path {}.".format(path)}
+        if method != "POST":
+            return 405, {"error": "Use POST to send the text to tag."}
+        try:
+            request = json.loads(body.decode("utf-8"))
+            text = request["text"]
+            metric = request.get("metric")
+            if not isinstance(text, str):
+                raise ValueError
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return 400, {"error": "The body must be a json object with the text to tag: {\"text\": \"...\"}."}
+        if metric is not None and metric not in handle.tagger.emission.metrics:
+            return 400, {"error": "Unknown metric {}. Use one of: {}.".format(metric, ", ".join(handle.tagger.emission.metrics))}
+        start = time.perf_counter()
+        try:
+            tagged_sentences = await self.batch_tagger.tag(text, metric)
+        except asyncio.QueueFull:
+            return 503, {"error": "Too many requests are waiting to be tagged. Try again later."}
+        time_ms = round((time.perf_counter() - start) * 1000, 3)
+        # the answer to a long text is built and encoded in a thread as well
+        # ответ на длинный текст тоже собирается и кодируется в потоке
+        if len(text) > self.batch_tagger.inline_text_size:
+            return 200, await asyncio.get_running_loop().run_in_executor(None, lambda: encode_json(tagging_answer(tagged_sentences, time_ms)))
+        return 200, tagging_answer(tagged_sentences, time_ms)
+
+    async def __respond(self, writer, status, response, keep_alive):
+        # the metrics are answered as plain text, everything else as json (bytes are json that is already encoded)
+        # метрики возвращаются простым текстом, все остальное в формате json (байты — уже закодированный json)
+        if isinstance(response, str):
+            body, content_type = response.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = response if isinstance(response, bytes) else encode_json(response), "application/json; charset=utf-8"
+        headers = [
+            "HTTP/1.1 {} {}".format(status, HTTP_REASONS[status]),
+            "Content-Type: {}".format(content_type),
+            "Content-Length: {}".format(len(body)),
+            "Connection: {}".format("keep-alive" if keep_alive else "close"),
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(model, host, port, max_batch_size, max_wait, max_queue, beam=None, top_k=None):
+    batch_tagger = BatchTagger(model, max_batch_size, max_wait, max_queue, beam, top_k)
+    server = TaggingServer(batch_tagger)
+    worker = asyncio.ensure_future(batch_tagger.run())
+    http_server = await asyncio.start_server(server.handle, host, port)
+    print("Tagging server listening on http://{}:{}/tag".format(host, port))
+    try:
+        async with http_server:
+            await http_server.serve_forever()
+    finally:
+        worker.cancel()
+
+
+if __name__ == "__main__":
+    # input command
+    # анализ входной команды
+    parser = argparse.ArgumentParser(description="HTTP server that loads the model once and tags the text of concurrent requests in batches")
+    parser.add_argument("-r", default=None, type=str, dest="readFrom", help="Full path to the folder that contains the statistical data obtained from the training set (it looks into /data if the folder is not specified)")
+    parser.add_argument("--host", default="127.0.0.1", type=str, help="Address to listen on (127.0.0.1 by default)")
+    parser.add_argument("-p", default=8000, type=int, dest="port", help="Port to listen on (8000 by default)")
+    parser.add_argument("-b", default=256, type=int, dest="maxBatchSize", help="Maximum number of sentences tagged in a single batch")
+    parser.add_argument("-t", default=5, type=float, dest="maxWait", help="Maximum time in milliseconds that a request waits for other requests to fill the batch")
+    parser.add_argument("-q", default=1024, type=int, dest="maxQueue", help="Maximum number of requests waiting to be tagged; the server answers 503 when it is reached")
+    parser.add_argument("--beam", default=None, type=int, dest="beam", help="Number of candidate tags per word kept after every decoding step (exact decoding by default)")
+    parser.add_argument("--top-k", default=None, type=int, dest="topK", help="Number of most probable candidate tags per word passed to the decoder (all of them by default)")
+    parser.add_argument("--stats", action="store_true", dest="stats", help="Collects the timings of every stage, the unknown words and the decoding failures and serves them at /metrics in the Prometheus text format")
+    parser.add_argument("--reload-interval", default=2, type=float, dest="reloadInterval", help="Seconds between the checks for a newly trained model in the data folder, which is loaded without stopping the server (0 disables the reload)")
+    args = parser.parse_args()
+
+    data_folder = os.getcwd() + "/data/" if args.readFrom == None else "{}".format(args.readFrom)
+    if not os.path.exists(data_folder):
+        raise ValueError("The specified path to the folder containing the statistical data does not exists.")
+
+    handle = ModelHandle(data_folder, args.reloadInterval, stats=Stats() if args.stats else None)
+    try:
+        asyncio.run(serve(handle, args.host, args.port, args.maxBatchSize, args.maxWait / 1000, args.maxQueue, args.beam, args.topK))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        handle.close()
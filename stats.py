@@ -0,0 +1,115 @@
+import json
+import time
+
+# upper bounds of the buckets of the histograms (number of words or candidate tags of a lattice)
+# верхние границы интервалов гистограмм (число слов или тегов-кандидатов решетки)
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Stats(object):
+    """Collects the timings of every stage of the tagger, the counts of unknown words per metric, the size of the lattices and the decoding failures.
+    The classes of the tagger only record into it when it is attached to them, so it costs nothing when it is not used."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Sets all the counters, timings and histograms back to zero."""
+        self.counters = {}
+        self.timings = {}
+        self.histograms = {}
+
+    @staticmethod
+    def clock():
+        return time.perf_counter()
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def time(self, stage, start):
+        """Adds the time elapsed since start (a value returned by clock) to the stage."""
+        elapsed = time.perf_counter() - start
+        timing = self.timings.setdefault(stage, [0, 0.0])
+        timing[0] += 1
+        timing[1] += elapsed
+
+    def observe(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = {"buckets": [0] * len(HISTOGRAM_BUCKETS), "count": 0, "sum": 0, "max": 0}
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+                break
+        histogram["count"] += 1
+        histogram["sum"] += value
+        histogram["max"] = max(histogram["max"], value)
+
+    def snapshot(self):
+        """Returns a copy of the collected statistics that can be serialized as json."""
+        counters = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {
+            "counters": counters,
+            "timings": {stage: {"calls": calls, "seconds": seconds} for stage, (calls, seconds) in sorted(self.timings.items())},
+            "histograms": {name: {"buckets": list(histogram["buckets"]), "count": histogram["count"], "sum": histogram["sum"], "max": histogram["max"]} for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def merge(self, snapshot):
+        """Adds a snapshot (for example, the one of a worker process) to the statistics."""
+        for name, values in snapshot["counters"].items():
+            for value in values:
+                self.count(name, value["value"], **value["labels"])
+        for stage, timing in snapshot["timings"].items():
+            current = self.timings.setdefault(stage, [0, 0.0])
+            current[0] += timing["calls"]
+            current[1] += timing["seconds"]
+        for name, histogram in snapshot["histograms"].items():
+            current = self.histograms.setdefault(name, {"buckets": [0] * len(HISTOGRAM_BUCKETS), "count": 0, "sum": 0, "max": 0})
+            current["buckets"] = [a + b for a, b in zip(current["buckets"], histogram["buckets"])]
+            current["count"] += histogram["count"]
+            current["sum"] += histogram["sum"]
+            current["max"] = max(current["max"], histogram["max"])
+
+    def to_prometheus(self, prefix="srn_tagger"):
+        """Returns the statistics in the Prometheus text exposition format."""
+        lines = []
+        snapshot = self.snapshot()
+        for name, values in snapshot["counters"].items():
+            metric = "{}_{}_total".format(prefix, name)
+            lines.append("# TYPE {} counter".format(metric))
+            for value in values:
+                lines.append("{}{} {}".format(metric, format_labels(value["labels"]), value["value"]))
+        if snapshot["timings"]:
+            lines.append("# TYPE {}_stage_seconds_total counter".format(prefix))
+            for stage, timing in snapshot["timings"].items():
+                lines.append("{}_stage_seconds_total{} {}".format(prefix, format_labels({"stage": stage}), repr(timing["seconds"])))
+            lines.append("# TYPE {}_stage_calls_total counter".format(prefix))
+            for stage, timing in snapshot["timings"].items():
+                lines.append("{}_stage_calls_total{} {}".format(prefix, format_labels({"stage": stage}), timing["calls"]))
+        for name, histogram in snapshot["histograms"].items():
+            metric = "{}_{}".format(prefix, name)
+            lines.append("# TYPE {} histogram".format(metric))
+            cumulative = 0
+            for bound, count in zip(HISTOGRAM_BUCKETS, histogram["buckets"]):
+                cumulative += count
+                lines.append("{}_bucket{} {}".format(metric, format_labels({"le": bound}), cumulative))
+            lines.append("{}_bucket{} {}".format(metric, format_labels({"le": "+Inf"}), histogram["count"]))
+            lines.append("{}_sum {}".format(metric, histogram["sum"]))
+            lines.append("{}_count {}".format(metric, histogram["count"]))
+        return "\n".join(lines) + "\n"
+
+    def save(self, filename):
+        """Saves the statistics as Prometheus text if the file has the extension .prom, otherwise as json."""
+        with open(filename, "w") as outfile:
+            if filename.endswith(".prom"):
+                outfile.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), outfile, indent=4)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, value) for name, value in labels.items()) + "}"
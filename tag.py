@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from tagger import Tokenizer, Emission, model_files, load_tagger
+from stats import Stats
+
+# tagger of the current worker process, loaded once by init_worker
+# теггер текущего рабочего процесса, загружается один раз в init_worker
+worker_tagger = None
+worker_metric = None
+worker_pruning = {}
+worker_n_best = None
+
+
+def init_worker(data_folder, metric, beam=None, top_k=None, collect_stats=False, n_best=None):
+    global worker_tagger, worker_metric, worker_pruning, worker_n_best
+    worker_tagger = load_tagger(data_folder)
+    if collect_stats:
+        worker_tagger.instrument(Stats())
+    worker_metric = metric
+    worker_pruning = {"beam": beam, "top_k": top_k}
+    worker_n_best = n_best
+
+
+def tag_chunk(sentences):
+    """Tags a chunk of tokenized sentences in a worker process (or gets their posteriors if n_best was given to init_worker). Returns the tagged sentences and, if the statistics are collected, the statistics of the chunk."""
+    if worker_n_best is None:
+        tagged_sentences = worker_tagger.tag_batch(sentences, worker_metric, **worker_pruning)
+    else:
+        tagged_sentences = worker_tagger.posteriors_batch(sentences, worker_metric, worker_n_best, top_k=worker_pruning["top_k"])
+    if worker_tagger.stats is None:
+        return tagged_sentences, None
+    snapshot = worker_tagger.stats.snapshot()
+    worker_tagger.stats.reset()
+    return tagged_sentences, snapshot
+
+
+def read_chunks(infile, tokenizer, chunk_size):
+    """Reads the input incrementally and groups its tokenized sentences in chunks."""
+    chunk = []
+    for sentence in tokenizer.iter_sentences(infile):
+        chunk.append(sentence)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_sentences(outfile, sentences, tagged_sentences, output_format):
+    """Writes the tagged sentences of a chunk. Sentences that could not be disambiguated are written without tags."""
+    for sentence, tagged_sentence in zip(sentences, tagged_sentences):
+        if output_format == "posteriors":
+            # every token with the posterior probabilities of its candidate tags and the most probable sequences with their probabilities
+            # каждый токен с апостериорными вероятностями его тегов-кандидатов и наиболее вероятные последовательности с их вероятностями
+            if tagged_sentence is False:
+                outfile.write("null\n")
+                continue
+            token_posteriors, sequences = tagged_sentence
+            outfile.write(json.dumps({
+                "tokens": [(token, posteriors) for token, posteriors in token_posteriors if token != "\n"],
+                "sequences": [{"tags": [(token, postag) for token, postag in sequence if token != "\n"], "probability": probability} for sequence, probability in sequences],
+            }, ensure_ascii=False) + "\n")
+            continue
+        if tagged_sentence is not False:
+            tagged_sentence = [(token, postag) for token, postag in tagged_sentence if token != "\n"]
+        if output_format == "jsonl":
+            outfile.write(json.dumps(tagged_sentence if tagged_sentence is not False else None, ensure_ascii=False) + "\n")
+        else:
+            if tagged_sentence is False:
+                tagged_sentence = [(token[0], "") for token in sentence if token[0] != "\n"]
+            for token, postag in tagged_sentence:
+                outfile.write("{}\t{}\n".format(token, postag))
+            outfile.write("\n")
+
+
+if __name__ == "__main__":
+    # input command
+    # анализ входной команды
+    parser = argparse.ArgumentParser(description="Tags a text file with part-of-speech tags using all the processor cores")
+    parser.add_argument("filename", nargs="?", default="-", type=str, help="Full path to the text file to tag (reads from the standard input if the file is not specified)")
+    parser.add_argument("-r", default=None, type=str, dest="readFrom", help="Full path to the folder that contains the statistical data obtained from the training set (it looks into /data if the folder is not specified)")
+    parser.add_argument("-w", default=None, type=str, dest="writeTo", help="Full path to the file to save the tagged text (writes to the standard output if the file is not specified)")
+    parser.add_argument("-f", default="tsv", choices=["tsv", "jsonl", "posteriors"], dest="outputFormat", help="Output format: one token and tag per line with blank lines between sentences (tsv), one json list per sentence (jsonl) or one json object per sentence with the posterior probabilities of the candidate tags of every token and the most probable sequences (posteriors)")
+    parser.add_argument("-j", default=os.cpu_count(), type=int, dest="jobs", help="Number of worker processes (all the processor cores by default)")
+    parser.add_argument("-c", default=500, type=int, dest="chunkSize", help="Number of sentences sent to a worker at once")
+    parser.add_argument("-m", default=None, choices=Emission.metrics, dest="metric", help="Metric to estimate the tags of the words not found in the training set")
+    parser.add_argument("--beam", default=None, type=int, dest="beam", help="Number of candidate tags per word kept after every decoding step (exact decoding by default)")
+    parser.add_argument("--top-k", default=None, type=int, dest="topK", help="Number of most probable candidate tags per word passed to the decoder (all of them by default)")
+    parser.add_argument("-n", default=1, type=int, dest="nBest", help="Number of most probable sequences per sentence written with the posteriors format (1 by default)")
+    parser.add_argument("--stats", default=None, type=str, dest="stats", help="Full path to a file to save the timings of every stage, the unknown words and the decoding failures (Prometheus text if the extension is .prom, json otherwise)")
+    parser.add_argument("--cache", default=None, type=str, dest="cache", help="Full path to a sqlite file that keeps the tagged sentences between runs; sentences found in it are not tagged again")
+    parser.add_argument("--cache-size", default=1000000, type=int, dest="cacheSize", help="Maximum number of sentences kept in the cache; the least recently used ones are evicted (1000000 by default)")
+    args = parser.parse_args()
+
+    # folder with the statistical data
+    # папка со статистическими данными
+    data_folder = os.getcwd() + "/data/" if args.readFrom == None else "{}".format(args.readFrom)
+    if not os.path.exists(data_folder):
+        raise ValueError("The specified path to the folder containing the statistical data does not exists.")
+    if args.outputFormat == "posteriors" and args.beam != None:
+        raise ValueError("The posteriors are computed over all the paths, so they cannot be combined with a beam.")
+    n_best = args.nBest if args.outputFormat == "posteriors" else None
+
+    infile = sys.stdin if args.filename == "-" else open(args.filename, encoding="utf-8")
+    outfile = sys.stdout if args.writeTo == None else open(args.writeTo, "w", encoding="utf-8")
+    tokenizer = Tokenizer()
+    stats = None
+    if args.stats != None:
+        stats = tokenizer.stats = Stats()
+    chunks = read_chunks(infile, tokenizer, args.chunkSize)
+
+    # the cached results depend on the model and on every option that changes the output
+    # кэшированные результаты зависят от модели и от всех параметров, которые меняют результат
+    cache = None
+    if args.cache != None:
+        from cache import ResultCache, file_fingerprint, MISSING
+        settings = json.dumps({"metric": args.metric, "beam": args.beam, "top_k": args.topK, "n_best": n_best})
+        cache = ResultCache(args.cache, file_fingerprint(model_files(data_folder)), settings, args.cacheSize)
+
+    def lookup_chunk(sentences):
+        """Returns the cached results of the chunk (None without a cache) and the sentences that still have to be tagged."""
+        if cache is None:
+            return None, sentences
+        cached = cache.get_many(sentences)
+        missing = [sentence for sentence, result in zip(sentences, cached) if result is MISSING]
+        if stats is not None:
+            stats.count("cache_hits", len(sentences) - len(missing))
+            stats.count("cache_misses", len(missing))
+        return cached, missing
+
+    def write_chunk(sentences, cached, result):
+        tagged_sentences, snapshot = result
+        if snapshot is not None:
+            stats.merge(snapshot)
+        if cached is not None:
+            cache.put_many([sentence for sentence, value in zip(sentences, cached) if value is MISSING], tagged_sentences)
+            tagged_sentences = iter(tagged_sentences)
+            tagged_sentences = [next(tagged_sentences) if value is MISSING else value for value in cached]
+        write_sentences(outfile, sentences, tagged_sentences, args.outputFormat)
+
+    if args.jobs <= 1:
+        init_worker(data_folder, args.metric, args.beam, args.topK, stats is not None, n_best)
+        for sentences in chunks:
+            cached, missing = lookup_chunk(sentences)
+            write_chunk(sentences, cached, tag_chunk(missing) if missing else ([], None))
+    else:
+        # the chunks are written in the original order; at most two chunks per worker are kept in memory
+        # фрагменты записываются в исходном порядке; в памяти хранится не более двух фрагментов на процесс
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker, initargs=(data_folder, args.metric, args.beam, args.topK, stats is not None, n_best)) as executor:
+            pending = deque()
+            for sentences in chunks:
+                # only the sentences that are not in the cache are sent to the workers
+                # рабочим процессам отправляются только предложения, которых нет в кэше
+                cached, missing = lookup_chunk(sentences)
+                pending.append((sentences, cached, executor.submit(tag_chunk, missing) if missing else None))
+                if len(pending) >= 2 * args.jobs:
+                    sentences, cached, future = pending.popleft()
+                    write_chunk(sentences, cached, future.result() if future is not None else ([], None))
+            while pending:
+                sentences, cached, future = pending.popleft()
+                write_chunk(sentences, cached, future.result() if future is not None else ([], None))
+
+    if infile is not sys.stdin:
+        infile.close()
+    if outfile is not sys.stdout:
+        outfile.close()
+    if cache is not None:
+        cache.close()
+    if stats is not None:
+        stats.save(args.stats)
@@ -1,18 +1,47 @@
+import os
 import json
 import re
+import math
+import functools
+import numpy as np
+from model import read_model, transition_tags, transition_sections, transition_table, EmissionRows, build_suffix_index, suffix_index_rows, word_shape
 
 # emission probabilities / вероятности результата 
 class Emission(object):
     """A class to assign probabilities to a word-form given a part-of-speech."""
-    def __init__(self, postag_dist, emission_prob, default_tags = ["NN", "JJ", "RB", "VB", "ST"], propername_tags = ["NP"], number_tag = "NUMB", punctuation_tag = "PNCT"):
+    metrics = ["frec", "ln", "itf", "none", "suffix"]  # metrics to estimate the tags of unknown words // метрики для оценки тегов неизвестных слов
+    suffix_coverage = 0.9  # share of the probability kept by the candidates of the suffix metric // доля вероятности, сохраняемая кандидатами метрики suffix
+    stats = None  # optional Stats object that records the timings and the unknown words // необязательный объект Stats для сбора статистики
+
+    def __init__(self, postag_dist, emission_prob, default_tags = ["NN", "JJ", "RB", "VB", "ST"], propername_tags = ["NP"], number_tag = "NUMB", punctuation_tag = "PNCT", cache_size = 65536, log_space = False):
+        with open(postag_dist, "r") as postag_dist_json:
+            postag_dist = json.load(postag_dist_json)
+        # the emission probabilities are only parsed when the first word is looked up (see __getattr__)
+        # вероятности результата разбираются только при поиске первого слова (см. __getattr__)
+        self.__emission_file = emission_prob
+        self.__setup(postag_dist, None, default_tags, propername_tags, number_tag, punctuation_tag, cache_size, log_space)
+
+    @classmethod
+    def from_model(cls, model, default_tags = ["NN", "JJ", "RB", "VB", "ST"], propername_tags = ["NP"], number_tag = "NUMB", punctuation_tag = "PNCT", cache_size = 65536, log_space = False):
+        """Creates the object from a binary model (a path or the result of read_model) instead of the json files."""
+        if isinstance(model, str):
+            model = read_model(model)
+        emission = cls.__new__(cls)
+        emission.__setup(model["postag_distribution"], EmissionRows(model), default_tags, propername_tags, number_tag, punctuation_tag, cache_size, log_space)
+        emission.__suffix_index = suffix_index_rows(model)
+        return emission
+
+    def __setup(self, postag_dist, emission_prob, default_tags, propername_tags, number_tag, punctuation_tag, cache_size, log_space):
+        """A helper method that initializes the object from the loaded part-of-speech distribution and emission probabilities."""
+        self.log_space = log_space  # the probabilities are returned as natural logarithms // вероятности возвращаются в виде натуральных логарифмов
         self.openclass_tags = []
         self.propername_tags = []
         self.number_tag = number_tag
         self.punctuation_tag = punctuation_tag
-        with open(postag_dist, "r") as postag_dist_json:
-            self.postag_dist = json.load(postag_dist_json)
-        with open(emission_prob, "r") as emission_prob_json:
-            self.emission_prob = json.load(emission_prob_json)
+        self.postag_dist = postag_dist
+        if emission_prob is not None:
+            self.emission_prob = emission_prob
+        self.__suffix_index = None  # built on first use of the suffix metric if the model does not contain it // строится при первом использовании метрики suffix
         for postag in default_tags:
             if postag in self.postag_dist.keys() and postag not in self.openclass_tags:
                 self.openclass_tags.append(postag)
@@ -22,24 +51,118 @@ class Emission(object):
         self.D = 0
         for k, v in self.postag_dist.items():
             self.D += v
+        self.number_postags = ((self.number_tag, self.__scale(1)),)
+        self.punctuation_postags = ((self.punctuation_tag, self.__scale(1)),)
+        # the estimates for unknown words only depend on the capitalization, the position and the metric, so they are computed once
+        # оценки для неизвестных слов зависят только от регистра, позиции и метрики, поэтому вычисляются один раз
+        self.__estimated_postags = {}
+        for capitalized in [False, True]:
+            for sentence_initial in [False, True]:
+                for metric in self.metrics + [None]:
+                    key = (capitalized, sentence_initial, metric)
+                    self.__estimated_postags[key] = tuple((tag, self.__scale(probability)) for tag, probability in self.__estimate_postags(capitalized, sentence_initial, metric))
+        # bounded cache of the candidate tags of the most recent word-forms // ограниченный кэш тегов последних словоформ
+        self.__cached_postags = functools.lru_cache(maxsize=cache_size)(self.__find_postags)
+        self.__cache_size = cache_size
+        self.__entry_lookups = {}  # candidate table -> cached lookup of the entry ids of the word-forms // таблица кандидатов -> кэшированный поиск номеров записей словоформ
+
+    def __getattr__(self, name):
+        """Loads the emission probabilities of the json file on first use."""
+        if name == "emission_prob" and "_Emission__emission_file" in self.__dict__:
+            with open(self.__dict__.pop("_Emission__emission_file"), "r") as emission_prob_json:
+                self.emission_prob = json.load(emission_prob_json)
+            return self.emission_prob
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def cache_info(self):
+        """Returns the hits, misses, maximum size and current size of the cache of candidate tags."""
+        return self.__cached_postags.cache_info()
+
+    def cache_clear(self):
+        """Empties the cache of candidate tags (and of their entry ids) and resets its counters."""
+        self.__cached_postags.cache_clear()
+        self.__entry_lookups = {}
 
     def __get_postags(self, token):
         """Method to return the part-of-speech tags extracted from the training set."""
         word = token.lower()
         if word in self.emission_prob.keys():
             postags = self.emission_prob[word]
-            return [(k, v) for k, v in postags.items()]
+            return tuple((k, self.__scale(v)) for k, v in postags.items())
         return False
 
-    def __estimate_postags(self, token, position, metric):
-        """Method that estimates a probability for words not found in the training set according to the chosen metric."""
-        methods = ["frec", "ln", "itf", "none"]
+    def __scale(self, probability):
+        """Returns the probability itself or, in log space, its natural logarithm."""
+        if not self.log_space:
+            return probability
+        return math.log(probability) if probability > 0 else -math.inf
+
+    def __find_postags(self, word, capitalized, sentence_initial, metric):
+        """Method that returns the tags from the training set or, for unknown words, the precomputed estimates. Its results are cached."""
+        postags = self.__get_postags(word)
+        if postags is False:
+            if metric == "suffix":
+                postags = self.__suffix_postags(word, capitalized, sentence_initial)
+            if postags is False:
+                postags = self.__estimated_postags[(capitalized, sentence_initial, metric if metric in self.metrics else None)]
+        return postags
+
+    def __unknown_word_tags(self, capitalized, sentence_initial):
+        """Returns the tags that an unknown word can take: the open class tags and, if it is capitalized, the proper name tags."""
         estimated_tags = self.openclass_tags
-        if token[0].isupper():
-            if position == 0:
+        if capitalized:
+            if sentence_initial:
                 estimated_tags = estimated_tags + self.propername_tags
             else:
                 estimated_tags = self.propername_tags
+        return estimated_tags
+
+    def __suffix_postags(self, word, capitalized, sentence_initial):
+        """Metric that ranks the tags of an unknown word by the tags of the rare words with its longest known suffix and its shape.
+        Only the most probable tags that together cover suffix_coverage of the probability are kept. Returns False if the suffix gives no information."""
+        estimated_tags = self.__unknown_word_tags(capitalized, sentence_initial)
+        if len(estimated_tags) < 2:
+            return False
+        if self.__suffix_index is None:
+            self.__suffix_index = build_suffix_index(self.postag_dist, self.emission_prob)
+        index = self.__suffix_index
+        total = sum(self.postag_dist[tag] for tag in estimated_tags)
+        prior = {tag: self.postag_dist[tag] / total for tag in estimated_tags}
+        # the longest suffix with counts for the possible tags, looked up from the longest to the shortest // самый длинный суффикс с частотами возможных тегов
+        features = []
+        for length in range(min(index["max_length"], len(word) - 1), 0, -1):
+            counts = index["suffixes"].get(word[-length:])
+            if counts is not None and any(counts.get(tag, 0) > 0 for tag in estimated_tags):
+                features.append(counts)
+                break
+        if not features:
+            return False
+        counts = index["shapes"].get(word_shape(word))
+        if counts is not None:
+            features.append(counts)
+        # naive Bayes combination of the smoothed tag distributions of the suffix and the shape
+        # наивное байесовское объединение сглаженных распределений тегов суффикса и формы
+        scores = dict(prior)
+        for counts in features:
+            feature_total = sum(counts.get(tag, 0) for tag in estimated_tags)
+            for tag in estimated_tags:
+                scores[tag] *= (counts.get(tag, 0) + prior[tag]) / (feature_total + 1) / prior[tag]
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        total = sum(score for tag, score in ranked)
+        candidates = []
+        covered = 0
+        for tag, score in ranked:
+            candidates.append((tag, score))
+            covered += score / total
+            if covered >= self.suffix_coverage:
+                break
+        total = sum(score for tag, score in candidates)
+        return tuple((tag, self.__scale(score / total)) for tag, score in candidates)
+
+    def __estimate_postags(self, capitalized, sentence_initial, metric):
+        """Method that estimates a probability for words not found in the training set according to the chosen metric."""
+        methods = ["frec", "ln", "itf", "none"]
+        estimated_tags = self.__unknown_word_tags(capitalized, sentence_initial)
         if metric in methods and len(estimated_tags) > 1:
             if metric == "itf":
                 postags = self.__itf(estimated_tags)
@@ -81,150 +204,508 @@ class Emission(object):
 
     def get_emission_probabilities(self, token_list, metric=None):
         """Main method to assign to a word given a part-of-speech. It calls other helper functions."""
+        stats = self.stats
+        if stats is not None:
+            started = stats.clock()
         postags = []
         for position, token in enumerate(token_list):
             entry = token[0]
             if token[1] in ["word", "acronym"]:
-                retreived_tags = self.__get_postags(entry)
-                if retreived_tags is False:
-                    retreived_tags = self.__estimate_postags(entry, position, metric)
-                    t = (entry, retreived_tags)
-                else:
-                    t = (entry, retreived_tags)
+                retreived_tags = self.__cached_postags(entry.lower(), entry[0].isupper(), position == 0, metric)
+                t = (entry, retreived_tags)
             elif token[1] == "number":
-                t = (entry, [(self.number_tag, 1)])
+                t = (entry, self.number_postags)
             else:
-                t = (entry, [(self.punctuation_tag, 1)])
+                t = (entry, self.punctuation_postags)
             postags.append(t)
+        if stats is not None:
+            stats.time("emission", started)
+            self.__record(stats, token_list, metric)
         return postags
 
+    def get_entry_ids(self, token_list, table, metric=None):
+        """Returns the array of the ids of the candidate tags of every token in a CandidateTable (CandidateTable.punctuation_id for the punctuation marks). It gives the same candidates as get_emission_probabilities, but the ids of the word-forms are cached, so no list of candidates is built for every token."""
+        stats = self.stats
+        if stats is not None:
+            started = stats.clock()
+        lookup = self.__entry_lookups.get(table)
+        if lookup is None:
+            lookup = self.__entry_lookups[table] = (functools.lru_cache(maxsize=self.__cache_size)(lambda word, capitalized, sentence_initial, metric: table.intern(self.__cached_postags(word, capitalized, sentence_initial, metric))), table.intern(self.number_postags))
+        word_lookup, number_id = lookup
+        entry_ids = []
+        for position, token in enumerate(token_list):
+            entry = token[0]
+            if token[1] in ["word", "acronym"]:
+                entry_ids.append(word_lookup(entry.lower(), entry[0].isupper(), position == 0, metric))
+            elif token[1] == "number":
+                entry_ids.append(number_id)
+            else:
+                entry_ids.append(table.punctuation_id)
+        if stats is not None:
+            stats.time("emission", started)
+            self.__record(stats, token_list, metric)
+        return np.array(entry_ids, dtype=np.intp)
+
+    def __record(self, stats, token_list, metric):
+        """A helper method that counts the tokens and the unknown words of a sentence per metric."""
+        unknown_words = sum(1 for token in token_list if token[1] in ["word", "acronym"] and token[0].lower() not in self.emission_prob)
+        stats.count("emission_tokens", len(token_list))
+        if unknown_words:
+            stats.count("oov_tokens", unknown_words, metric=metric if metric in self.metrics else "default")
+
     def __ln(self, x):
         """A simple function to get the log of a value."""
         val = x
         return 99999999 * (x ** (1 / 99999999) - 1)
 
 
+# Interned candidate tags / интернированные теги-кандидаты
+class CandidateTable(object):
+    """Stores every distinct list of candidate tags given by Emission once, in flat arrays indexed by integer ids, so a sentence is decoded as an array of entry ids instead of lists of strings.
+    The lists of candidates are interned here when they reach the decoder as strings, or the ids are looked up directly by Emission.get_entry_ids."""
+    punctuation_id = -2  # id of the punctuation marks, which are skipped by the decoder and put back in the output // номер знаков препинания, которые пропускаются декодером и возвращаются в результат
+
+    def __init__(self, tag_index, log_space, top_k=None):
+        self.tag_index = tag_index
+        self.log_space = log_space
+        self.top_k = top_k
+        self.entry_ids = {}  # list of candidates -> entry id // список кандидатов -> номер записи
+        self.full_tags = []  # tags with their subtags, restored in the output // теги с подтегами, восстанавливаемые в результате
+        self.full_tag_index = {}
+        self.size = 0  # number of entries // число записей
+        self.length = 0  # number of candidates of all the entries // число кандидатов всех записей
+        self.starts = np.zeros(1024, dtype=np.intp)
+        self.counts = np.zeros(1024, dtype=np.intp)
+        self.tag_ids = np.zeros(4096, dtype=np.intp)
+        self.log_probabilities = np.zeros(4096, dtype=float)
+        self.full_tag_ids = np.zeros(4096, dtype=np.intp)
+
+    def intern(self, postags):
+        """Returns the id of the entry with the candidate tags of a token, or -1 if none of them is a known tag."""
+        entry_id = self.entry_ids.get(postags)
+        if entry_id is None:
+            entry_id = self.entry_ids[postags] = self.__add(postags)
+        return entry_id
+
+    def __add(self, postags):
+        """A helper method that maps the candidate tags to the base tag ids (keeping the highest probability and the first full tag of every base tag) and appends them to the arrays."""
+        candidates = {}
+        full_tags = {}
+        for tag, probability in postags:
+            tag_id = self.tag_index.get(tag.split("_")[0])
+            if tag_id is not None and probability > candidates.get(tag_id, -math.inf):
+                candidates[tag_id] = probability
+                full_tags.setdefault(tag_id, tag)
+        if not candidates:
+            return -1
+        if self.top_k is not None and len(candidates) > self.top_k:
+            candidates = dict(sorted(candidates.items(), key=lambda candidate: candidate[1], reverse=True)[:self.top_k])
+        if self.size == len(self.starts):
+            self.starts = np.resize(self.starts, 2 * self.size)
+            self.counts = np.resize(self.counts, 2 * self.size)
+        while self.length + len(candidates) > len(self.tag_ids):
+            self.tag_ids = np.resize(self.tag_ids, 2 * len(self.tag_ids))
+            self.log_probabilities = np.resize(self.log_probabilities, 2 * len(self.log_probabilities))
+            self.full_tag_ids = np.resize(self.full_tag_ids, 2 * len(self.full_tag_ids))
+        start, end = self.length, self.length + len(candidates)
+        probabilities = np.array(list(candidates.values()), dtype=float)
+        if not self.log_space:
+            with np.errstate(divide="ignore"):
+                probabilities = np.log(probabilities)
+        self.tag_ids[start:end] = list(candidates.keys())
+        self.log_probabilities[start:end] = probabilities
+        self.full_tag_ids[start:end] = [self.__full_tag_id(full_tags[tag_id]) for tag_id in candidates.keys()]
+        self.starts[self.size] = start
+        self.counts[self.size] = len(candidates)
+        self.size += 1
+        self.length = end
+        return self.size - 1
+
+    def __full_tag_id(self, tag):
+        full_tag_id = self.full_tag_index.get(tag)
+        if full_tag_id is None:
+            full_tag_id = self.full_tag_index[tag] = len(self.full_tags)
+            self.full_tags.append(tag)
+        return full_tag_id
+
+    def gather(self, entry_ids):
+        """Returns the flat arrays of candidate positions (in the table), tag ids and log-probabilities and the number of candidates per token of a [sentences, tokens] array of entry ids."""
+        counts = self.counts[entry_ids]
+        flat_counts = counts.ravel()
+        offsets = np.cumsum(flat_counts) - flat_counts
+        positions = np.arange(flat_counts.sum()) + np.repeat(self.starts[entry_ids].ravel() - offsets, flat_counts)
+        return positions, self.tag_ids[positions], self.log_probabilities[positions], counts
+
+
+def ordered_sum(array, axis):
+    """Sums an array along an axis one slice at a time, in order. The padded candidates add exact zeros at the end and the other sentences of the batch are never mixed in, so the result of every sentence does not depend on the batch it is computed in."""
+    slices = np.moveaxis(array, axis, 0)
+    total = slices[0].copy()
+    for part in slices[1:]:
+        total += part
+    return total
+
+
 # Transition probabilities / вероятности результата
 class Transition(object):
     """A class to assign probabilities to a part-ofword-form given a part-of-speech."""
-    def __init__(self, transition_probabilities, punctuation_tag="PNCT"):
+    stats = None  # optional Stats object that records the timings, the lattice sizes and the failures // необязательный объект Stats для сбора статистики
+
+    def __init__(self, transition_probabilities, punctuation_tag="PNCT", prestart_tag="*", start_tag="S", end_tag="E", log_space=False):
+        self.__setup(punctuation_tag, prestart_tag, start_tag, end_tag, log_space)
+        # the json file is only parsed when the first sentence is decoded (see __getattr__)
+        # файл json разбирается только при декодировании первого предложения (см. __getattr__)
+        self.__transition_file = transition_probabilities
+
+    @classmethod
+    def from_model(cls, model, punctuation_tag="PNCT", prestart_tag="*", start_tag="S", end_tag="E", log_space=False):
+        """Creates the object from a binary model (a path or the result of read_model). The transition array is memory-mapped instead of parsed."""
+        if isinstance(model, str):
+            model = read_model(model)
+        transition = cls.__new__(cls)
+        transition.__setup(punctuation_tag, prestart_tag, start_tag, end_tag, log_space)
+        transition.data = None
+        transition.tags = model["tags"]
+        transition.tag_index = {tag: i for i, tag in enumerate(transition.tags)}
+        transition.log_prob = transition_table(model)
+        return transition
+
+    def __getattr__(self, name):
+        """Loads the transition probabilities of the json file on first use."""
+        if name in ["data", "tags", "tag_index", "log_prob"] and "_Transition__transition_file" in self.__dict__:
+            with open(self.__dict__.pop("_Transition__transition_file")) as json_file:
+                self.data = json.load(json_file)
+            self.__build_log_probabilities()
+            return getattr(self, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def __setup(self, punctuation_tag, prestart_tag, start_tag, end_tag, log_space):
+        """A helper method that stores the special tags."""
+        self.log_space = log_space  # the emission probabilities are given as natural logarithms // вероятности результата даны в виде натуральных логарифмов
         self.punctuation_tag = punctuation_tag
-        with open(transition_probabilities) as json_file:
-            self.data = json.load(json_file)
-
-    def __separate_punctuation_marks(self, sentence):
-        """A helper method that removes the punctuation marks from token list and saves them with their possition to restore them after the process is finished."""
-        sentence_without_punctuation_marks = []
-        punctuation_marks_positions = {}
-        for i, token in enumerate(sentence):
-            if token[1][0][0] == self.punctuation_tag:
-                punctuation_marks_positions[i] = token[0]  # stores the punctuation sign in a hash-table with their position as key for later retrieval
-            else:
-                sentence_without_punctuation_marks.append(token)
-        return sentence_without_punctuation_marks, punctuation_marks_positions
+        self.prestart_tag = prestart_tag
+        self.start_tag = start_tag
+        self.end_tag = end_tag
+
+    def __build_log_probabilities(self):
+        """A helper method that turns the transition table into log-probabilities indexed by [u, v, t] arrays of integer tag ids: a dense array for the old json files and the interpolation of the observed n-grams for the sparse ones."""
+        tags = {self.prestart_tag, self.start_tag} | transition_tags(self.data)
+        self.tags = sorted(tags)
+        self.tag_index = {tag: i for i, tag in enumerate(self.tags)}
+        self.log_prob = transition_table(transition_sections(self.data, self.tag_index))
+
+    def candidate_table(self, top_k=None):
+        """Returns the interned candidate tags for the given pruning, which Emission.get_entry_ids looks up. The tables are created on first use and kept for the following calls."""
+        tables = self.__dict__.setdefault("_Transition__candidate_tables", {})
+        table = tables.get(top_k)
+        if table is None:
+            table = tables[top_k] = CandidateTable(self.tag_index, self.log_space, top_k)
+        return table
+
+    def __position_candidates(self, flat_tag_ids, flat_log_emissions, counts, starts, position):
+        """A helper method that returns the [sentences, candidates] arrays of tag ids and log-probabilities of the words at a position of a batch, padded to the widest word with impossible tags."""
+        if counts.shape[0] == 1:
+            start = starts[0, position]
+            end = start + counts[0, position]
+            return flat_tag_ids[None, start:end], flat_log_emissions[None, start:end]
+        width = np.arange(counts[:, position].max())
+        mask = width < counts[:, position, None]
+        indices = np.where(mask, starts[:, position, None] + width, 0)
+        return flat_tag_ids[indices], np.where(mask, flat_log_emissions[indices], -np.inf)
+
+    def __viterbi(self, flat_tag_ids, flat_log_emissions, counts, beam=None, context=None, initial=None, closed=True):
+        """Trigram Viterbi algorithm over (u, v) states for a batch of lattices with the same number of tokens, given as the flat arrays of candidate tag ids and log-probabilities and the [sentences, tokens] array of candidates per token. The candidates of every position are padded to the widest token with impossible tags. If a beam is given, only the beam candidates with the best paths are kept at every position.
+        A lattice starts after the prestart and start tags or, for the segments of a sentence, after the two tags of the [sentences, 2] context with the initial log-probabilities of the paths that reach them; only the closed lattices end with the transition to the end tag. Returns the [sentences, tokens] array of the best tag ids and the log-probability of the best path of every lattice (-inf if no path has a non-zero probability)."""
+        batch_size = counts.shape[0]
+        rows = np.arange(batch_size)
+        starts = (np.cumsum(counts) - counts.ravel()).reshape(counts.shape)
+        if context is None:
+            candidates = [np.full((batch_size, 1), self.tag_index[self.prestart_tag]), np.full((batch_size, 1), self.tag_index[self.start_tag])]
+        else:
+            candidates = [context[:, :1], context[:, 1:]]
+        backpointers = [None, None]
+        delta = np.zeros((batch_size, 1, 1)) if initial is None else initial.reshape(batch_size, 1, 1)  # log-probability of the best path ending in each (u, v) pair of candidates
+        for position in range(counts.shape[1]):
+            tag_ids, log_emission = self.__position_candidates(flat_tag_ids, flat_log_emissions, counts, starts, position)
+            scores = delta[:, :, :, None] + self.log_prob[candidates[-2][:, :, None, None], candidates[-1][:, None, :, None], tag_ids[:, None, None, :]] + log_emission[:, None, None, :]
+            backpointer = scores.argmax(axis=1)
+            delta = scores.max(axis=1)
+            if beam is not None and tag_ids.shape[1] > beam:
+                # only the candidates with the best paths are extended, so the next position works on at most beam x beam states
+                # продолжаются только кандидаты с лучшими путями, поэтому следующая позиция обрабатывает не более beam x beam состояний
+                kept = np.sort(np.argsort(-delta.max(axis=1), axis=1, kind="stable")[:, :beam], axis=1)
+                tag_ids = np.take_along_axis(tag_ids, kept, axis=1)
+                delta = np.take_along_axis(delta, kept[:, None, :], axis=2)
+                backpointer = np.take_along_axis(backpointer, kept[:, None, :], axis=2)
+            backpointers.append(backpointer)
+            candidates.append(tag_ids)
+        final = delta + self.log_prob[candidates[-2][:, :, None], candidates[-1][:, None, :], self.tag_index[self.end_tag]] if closed else delta
+        best = final.reshape(batch_size, -1).argmax(axis=1)
+        positions = [None] * len(candidates)
+        positions[-2], positions[-1] = np.unravel_index(best, final.shape[1:])
+        for i in range(len(candidates) - 1, 1, -1):
+            positions[i - 2] = backpointers[i][rows, positions[i - 1], positions[i]]
+        paths = np.array([candidates[i][rows, positions[i]] for i in range(2, len(candidates))], dtype=np.intp).reshape(-1, batch_size).T
+        return paths, final[rows, positions[-2], positions[-1]]
+
+    def __forward_backward(self, flat_tag_ids, flat_log_emissions, counts, n_best=1):
+        """Forward-backward algorithm over the same (u, v) states as __viterbi for a batch of lattices with the same number of tokens. The forward pass also keeps the n_best best paths of every state, so the posteriors and the best sequences are found in one pass.
+        Returns the list of [sentences, candidates] arrays of posteriors of the candidates of every position, the [sentences, n_best, tokens] array of the candidate columns of the best paths, the [sentences, n_best] array of their log-probabilities and the log-probability of every lattice."""
+        batch_size, length = counts.shape
+        rows = np.arange(batch_size)[:, None]
+        starts = (np.cumsum(counts) - counts.ravel()).reshape(counts.shape)
+        candidates = [np.full((batch_size, 1), self.tag_index[self.prestart_tag]), np.full((batch_size, 1), self.tag_index[self.start_tag])]
+        # the sums of the forward and backward passes are done with probabilities: the scores of every position are shifted by their maximum before exp and the forward sums are scaled to 1, so nothing underflows and the logarithms of the shifts and scales add up to the log-probability of the lattice
+        # суммы прямого и обратного проходов вычисляются с вероятностями: оценки каждой позиции сдвигаются на их максимум перед exp, а прямые суммы нормируются к 1, поэтому ничего не теряется, а логарифмы сдвигов и масштабов в сумме дают логарифм вероятности решетки
+        alphas = [np.ones((batch_size, 1, 1))]  # scaled probability of all the paths ending in each (u, v) pair of candidates
+        log_probability = np.zeros(batch_size)
+        delta = np.full((batch_size, 1, 1, n_best), -np.inf)  # log-probabilities of the n_best paths ending in each (u, v) pair
+        delta[:, :, :, 0] = 0
+        weights = []
+        backpointers = []
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for position in range(length):
+                tag_ids, log_emission = self.__position_candidates(flat_tag_ids, flat_log_emissions, counts, starts, position)
+                transition = self.log_prob[candidates[-2][:, :, None, None], candidates[-1][:, None, :, None], tag_ids[:, None, None, :]]
+                # the paths of every (v, t) pair come from every u and every rank of the (u, v) state; the best n_best of them are kept
+                # пути каждой пары (v, t) приходят из каждого u и каждого ранга состояния (u, v); сохраняются лучшие n_best из них
+                scores = delta[:, :, :, None, :] + transition[:, :, :, :, None] + log_emission[:, None, None, :, None]
+                scores = scores.transpose(0, 2, 3, 1, 4).reshape(batch_size, scores.shape[2], scores.shape[3], -1)
+                if n_best == 1:
+                    backpointer = scores.argmax(axis=3)[:, :, :, None]
+                else:
+                    backpointer = np.argsort(-scores, axis=3, kind="stable")[:, :, :, :n_best]
+                delta = np.take_along_axis(scores, backpointer, axis=3)
+                backpointers.append(backpointer)
+                # only the (u, v) states that some path reaches count, so the padded candidates of the other sentences of the batch do not change the shift
+                # учитываются только состояния (u, v), до которых доходит какой-либо путь, поэтому дополнительные кандидаты других предложений пакета не меняют сдвиг
+                local = np.where(alphas[-1][:, :, :, None] > 0, transition + log_emission[:, None, None, :], -np.inf)
+                shift = local.reshape(batch_size, -1).max(axis=1)
+                shift = np.where(shift == -np.inf, 0, shift)
+                weight = np.exp(local - shift[:, None, None, None])
+                alpha = ordered_sum(alphas[-1][:, :, :, None] * weight, 1)
+                scale = ordered_sum(ordered_sum(alpha, 1), 1)
+                alphas.append(alpha / np.where(scale == 0, 1, scale)[:, None, None])
+                log_probability += shift + np.log(scale)
+                weights.append(weight)
+                candidates.append(tag_ids)
+            end = self.log_prob[candidates[-2][:, :, None], candidates[-1][:, None, :], self.tag_index[self.end_tag]]
+            beta = np.where(alphas[-1] > 0, np.exp(end, dtype=float), 0)  # scaled probability of all the paths from each (u, v) pair of candidates to the end of the sentence
+            log_probability += np.log(ordered_sum(ordered_sum(alphas[-1] * beta, 1), 1))
+            posteriors = [None] * length
+            for position in range(length - 1, -1, -1):
+                posterior = ordered_sum(alphas[position + 1] * beta, 1)
+                total = ordered_sum(posterior, 1)
+                posteriors[position] = posterior / np.where(total == 0, 1, total)[:, None]
+                beta = ordered_sum(weights[position] * beta[:, None, :, :], 3)
+                total = beta.reshape(batch_size, -1).max(axis=1)
+                beta /= np.where(total == 0, 1, total)[:, None, None]
+        final = (delta + end[:, :, :, None]).reshape(batch_size, -1)
+        best = np.argsort(-final, axis=1, kind="stable")[:, :n_best]
+        best_log_probabilities = np.take_along_axis(final, best, axis=1)
+        u, v, rank = np.unravel_index(best, delta.shape[1:])
+        columns = [None] * length
+        for position in range(length - 1, -1, -1):
+            columns[position] = v
+            pointer = backpointers[position][rows, u, v, rank]
+            u, v, rank = pointer // n_best, u, pointer % n_best
+        columns = np.array(columns, dtype=np.intp).reshape(length, batch_size, best.shape[1]).transpose(1, 2, 0)
+        return posteriors, columns, best_log_probabilities, log_probability
+
+    def __entry_ids(self, table, tagged_tokens):
+        """A helper method that interns the candidate tags of every token of a sentence given by Emission.get_emission_probabilities."""
+        return np.array([table.punctuation_id if token[1][0][0] == self.punctuation_tag else table.intern(token[1]) for token in tagged_tokens], dtype=np.intp)
 
-    def get_sequence(self, pos_tags):
+    def __restore_sentence(self, tokens, token_ids, full_tags):
+        """A helper method that puts the punctuation marks back and materializes the full tag of every word from its id."""
+        full_tags = iter(full_tags)
+        return [(token[0], self.punctuation_tag) if token_id == CandidateTable.punctuation_id else (token[0], next(full_tags)) for token, token_id in zip(tokens, token_ids.tolist())]
+
+    def get_sequence(self, pos_tags, beam=None, top_k=None, anchors=False):
         """A method to disambiguate the part-of-speech tags attributed to the words using the context of the sentence."""
-        tagged_tokens = pos_tags
-        sentence_without_punctuation_marks, punctuation_marks_positions = self.__separate_punctuation_marks(tagged_tokens)
-        error_in_desambiguation_process = False
-        desambiguated_sentence = []
-        token_counter = 1
-        end_of_sentence = ("EOS", [("E", 1)])
-        sentence_without_punctuation_marks.append(end_of_sentence)
-
-        previous_states = [{"S": [1, "*"]}]
-        for token in sentence_without_punctuation_marks:
-            current_states = []
-            dict_pos = {}
-            token_counter += 1
-            possible_tags = token[1]
-            for tag in possible_tags:
-                main_pos = tag[0].split("_")
-                t = main_pos[0]
-                dict_pos[t] = [0, ""]
-                for key, value in previous_states[-1].items():
-                    previous_state_prob = value[0]
-                    emission_prob = tag[1]
-                    u_v = "{}_{}".format(value[1], key)
-                    transition_prob = self.data[t][u_v]
-                    probability = previous_state_prob * emission_prob * transition_prob
-                    if probability > dict_pos[t][0]:
-                        dict_pos[t][0] = probability
-                        dict_pos[t][1] = key
-            previous_states.append(dict_pos)
-
-        highest_score = "E"
-        desambiguated_tag_list = []
-        for i in previous_states[::-1]:
-            try:
-                highest_score = i[highest_score][1]
-                desambiguated_tag_list.append(highest_score)
-            except:
-                error_in_desambiguation_process = True
-
-        desambiguated_tag_list_reversed = desambiguated_tag_list[::-1][2:]
-        desambiguated_sentence = []
-        punctuation_marks_counter = 0
-        for i, token in enumerate(tagged_tokens):
-            if i in punctuation_marks_positions.keys():
-                punct_mark_list = punctuation_marks_positions[i]
-                pair = (punct_mark_list, self.punctuation_tag)
-                desambiguated_sentence.append(pair)
-                punctuation_marks_counter += 1
-            else:
-                desambiguated_pos = desambiguated_tag_list_reversed[i-punctuation_marks_counter]
-                alternatives = tagged_tokens[i][1]
-                for j, alternative in enumerate(alternatives):
-                    base_tag = alternative[0].split("_")
-                    if base_tag[0] == desambiguated_pos:
-                        pair = (tagged_tokens[i][0], tagged_tokens[i][1][j][0])
-                        desambiguated_sentence.append(pair)
-                        break
-        if error_in_desambiguation_process:
-            return False
-        return desambiguated_sentence
+        return self.get_sequences([pos_tags], beam=beam, top_k=top_k, anchors=anchors)[0]
+
+    def __segments(self, single, anchors):
+        """A helper method that splits a lattice after every two consecutive words with a single candidate: every path of the lattice goes through their tags, so the words before and after them are decoded separately. Returns the start and end of every segment and whether it closes the sentence."""
+        length = len(single)
+        ends = (np.flatnonzero(single[1:] & single[:-1]) + 2).tolist() if anchors and length > 1 else []
+        if not ends or ends[-1] != length:
+            ends.append(length)
+        return [(start, end, end == length) for start, end in zip([0] + ends[:-1], ends)]
+
+    def __context(self, path, start):
+        """A helper method that returns the tag ids of the two words before a segment, or of the prestart and start tags for the first one."""
+        if start == 0:
+            return self.tag_index[self.prestart_tag], self.tag_index[self.start_tag]
+        return path[start - 2], path[start - 1]
+
+    def get_sequences(self, pos_tags_list, batch_size=256, beam=None, top_k=None, anchors=False, token_ids=None):
+        """A method to disambiguate a batch of sentences at once. Sentences (or segments) with the same number of words are decoded together in one array pass.
+        If anchors is True, two consecutive words with a single candidate fix the (u, v) state of every path, so the sentences are split there into segments. The segments of a sentence are decoded in turn, each one starting from the log-probability of the path that reaches it, and batched with the segments of the same length of other sentences; the segments where every word has a single candidate are not decoded at all. The paths are exactly those of the whole sentences. The splitting is off by default, as on the bundled texts it does not make the decoding faster.
+        The search is exact by default; beam (candidates kept per word after each step) and top_k (most probable candidates per word) prune it to bound the work per word.
+        If token_ids (the arrays given by Emission.get_entry_ids for the candidate table of top_k) are given, pos_tags_list only needs the tokens themselves and the candidates are not interned again."""
+        if (beam is not None and beam < 1) or (top_k is not None and top_k < 1):
+            raise ValueError("The beam width and the number of candidates per word must be at least 1.")
+        stats = self.stats
+        if stats is not None:
+            started = stats.clock()
+        table = self.candidate_table(top_k)
+        if token_ids is None:
+            token_ids = [self.__entry_ids(table, tagged_tokens) for tagged_tokens in pos_tags_list]
+        results = [False] * len(pos_tags_list)
+        sentences = {}  # index -> [entry ids, tag ids of the path, segments left, log-probability of the path so far] // индекс -> [номера записей, номера тегов пути, оставшиеся сегменты, логарифм вероятности пути]
+        u, v, t, log_emissions = [], [], [], []
+        # every word is replaced by the id of its candidate tags; the punctuation marks are skipped and put back at the end
+        # каждое слово заменяется номером его тегов-кандидатов; знаки препинания пропускаются и возвращаются в конце
+        for index, sentence_ids in enumerate(token_ids):
+            entry_ids = sentence_ids[sentence_ids != table.punctuation_id]
+            if (entry_ids == -1).any():
+                if stats is not None:
+                    stats.count("decode_failures", reason="no_candidates")
+                continue
+            counts = table.counts[entry_ids]
+            single = counts == 1
+            # the tag of every word with a single candidate is already known; the decoder fills in the others
+            # тег каждого слова с одним кандидатом уже известен; остальные заполняет декодер
+            path = np.where(single, table.tag_ids[table.starts[entry_ids]], -1)
+            segments = []
+            for start, end, closed in self.__segments(single, anchors):
+                if not single[start:end].all():
+                    segments.append((start, end, closed, None))
+                    continue
+                # the transitions and emissions of the single path of a determined segment are looked up together with the others below
+                # переходы и вероятности результата единственного пути определенного сегмента ищутся ниже вместе с остальными
+                tags = list(self.__context(path, start)) + path[start:end].tolist() + ([self.tag_index[self.end_tag]] if closed else [])
+                segments.append((start, end, closed, (len(u), len(u) + len(tags) - 2)))
+                u.extend(tags[:-2])
+                v.extend(tags[1:-1])
+                t.extend(tags[2:])
+                log_emissions.extend(table.log_probabilities[table.starts[entry_ids[start:end]]].tolist() + ([0.0] if closed else []))
+            sentences[index] = [entry_ids, path, segments, 0.0]
+            if stats is not None:
+                stats.observe("lattice_words", len(entry_ids))
+                stats.observe("lattice_candidates", int(counts.sum()))
+        if u:
+            transitions = self.log_prob[np.array(u, dtype=np.intp), np.array(v, dtype=np.intp), np.array(t, dtype=np.intp)].tolist()
+        active = list(sentences)
+        while active:
+            groups = {}
+            for index in active:
+                sentence = sentences[index]
+                # a determined segment only adds the log-probabilities of its path, in the same order as the decoder
+                # определенный сегмент только добавляет логарифмы вероятностей своего пути в том же порядке, что и декодер
+                while sentence[2] and sentence[2][0][3] is not None:
+                    first, last = sentence[2].pop(0)[3]
+                    for transition, log_emission in zip(transitions[first:last], log_emissions[first:last]):
+                        sentence[3] = sentence[3] + transition + log_emission
+                    if stats is not None:
+                        stats.count("lattice_segments", kind="determined")
+                if sentence[3] == -np.inf:
+                    sentence[2] = []
+                if sentence[2]:
+                    start, end, closed, _ = sentence[2][0]
+                    groups.setdefault((end - start, closed), []).append(index)
+            for (length, closed), group in groups.items():
+                for offset in range(0, len(group), batch_size):
+                    chunk = group[offset:offset + batch_size]
+                    segments = [sentences[index][2].pop(0) for index in chunk]
+                    entry_ids = np.array([sentences[index][0][start:end] for index, (start, end, _, _) in zip(chunk, segments)], dtype=np.intp).reshape(len(chunk), length)
+                    context = np.array([self.__context(sentences[index][1], start) for index, (start, _, _, _) in zip(chunk, segments)], dtype=np.intp)
+                    initial = np.array([sentences[index][3] for index in chunk])
+                    _, flat_tag_ids, flat_log_emissions, counts = table.gather(entry_ids)
+                    paths, log_probabilities = self.__viterbi(flat_tag_ids, flat_log_emissions, counts, beam, context, initial, closed)
+                    for row, (index, (start, end, _, _)) in enumerate(zip(chunk, segments)):
+                        sentences[index][1][start:end] = paths[row]
+                        sentences[index][3] = float(log_probabilities[row])
+                    if stats is not None:
+                        stats.count("lattice_segments", len(chunk), kind="decoded")
+            active = [index for index in active if sentences[index][2]]
+        # the full tag of every word is the one of the candidate with the chosen tag id
+        # полный тег каждого слова берется у кандидата с выбранным номером тега
+        decoded = []
+        for index, sentence in sentences.items():
+            if sentence[3] > -np.inf:
+                decoded.append(index)
+            elif stats is not None:
+                stats.count("decode_failures", reason="zero_probability")
+        if decoded:
+            positions, flat_tag_ids, _, counts = table.gather(np.concatenate([sentences[index][0] for index in decoded])[None, :])
+            chosen = np.repeat(np.concatenate([sentences[index][1] for index in decoded]), counts.ravel()) == flat_tag_ids
+            full_tag_ids = table.full_tag_ids[positions[chosen]].tolist()
+            start = 0
+            for index in decoded:
+                end = start + len(sentences[index][0])
+                results[index] = self.__restore_sentence(pos_tags_list[index], token_ids[index], [table.full_tags[full_tag_id] for full_tag_id in full_tag_ids[start:end]])
+                start = end
+        if stats is not None:
+            stats.time("decode", started)
+            stats.count("sentences_decoded", len(pos_tags_list))
+        return results
+
+    def get_posterior(self, pos_tags, n_best=1, top_k=None):
+        """A method to get the posterior probability of every candidate tag of the words of a sentence and its n_best most probable sequences."""
+        return self.get_posteriors([pos_tags], n_best=n_best, top_k=top_k)[0]
+
+    def get_posteriors(self, pos_tags_list, n_best=1, batch_size=256, top_k=None, token_ids=None):
+        """A method to get the posteriors of a batch of sentences at once with the forward-backward algorithm. For every sentence it returns a list with every token and its candidate tags with their posterior probabilities (the most probable first) and a list with the n_best most probable tagged sequences and their probabilities given the sentence, or False if the sentence could not be disambiguated.
+        The first sequence is the one given by get_sequence. As in get_sequences, token_ids can give the entry ids of the tokens looked up by Emission.get_entry_ids."""
+        if n_best < 1 or (top_k is not None and top_k < 1):
+            raise ValueError("The number of sequences and the number of candidates per word must be at least 1.")
+        stats = self.stats
+        if stats is not None:
+            started = stats.clock()
+        table = self.candidate_table(top_k)
+        if token_ids is None:
+            token_ids = [self.__entry_ids(table, tagged_tokens) for tagged_tokens in pos_tags_list]
+        results = [False] * len(pos_tags_list)
+        groups = {}
+        for index, sentence_ids in enumerate(token_ids):
+            entry_ids = sentence_ids[sentence_ids != table.punctuation_id]
+            if not (entry_ids == -1).any():
+                groups.setdefault(len(entry_ids), []).append((index, entry_ids))
+            elif stats is not None:
+                stats.count("decode_failures", reason="no_candidates")
+        for group in groups.values():
+            for start in range(0, len(group), batch_size):
+                chunk = group[start:start + batch_size]
+                entry_ids = np.array([entry_ids for index, entry_ids in chunk], dtype=np.intp).reshape(len(chunk), -1)
+                positions, flat_tag_ids, flat_log_emissions, counts = table.gather(entry_ids)
+                posteriors, columns, best_log_probabilities, log_probability = self.__forward_backward(flat_tag_ids, flat_log_emissions, counts, n_best)
+                starts = (np.cumsum(counts) - counts.ravel()).reshape(counts.shape)
+                full_tag_ids = table.full_tag_ids[positions].tolist()
+                for row, (index, _) in enumerate(chunk):
+                    if log_probability[row] == -np.inf:
+                        if stats is not None:
+                            stats.count("decode_failures", reason="zero_probability")
+                        continue
+                    # the candidate in a column of a word is found at the start of the word in the flat arrays plus the column
+                    # кандидат в столбце слова находится в плоских массивах по началу слова плюс номер столбца
+                    word_posteriors = []
+                    for position in range(counts.shape[1]):
+                        word_posteriors.append(sorted(((table.full_tags[full_tag_ids[starts[row, position] + column]], posterior) for column, posterior in enumerate(posteriors[position][row, :counts[row, position]].tolist())), key=lambda candidate: candidate[1], reverse=True))
+                    sequences = []
+                    for path, path_log_probability in zip(columns[row].tolist(), best_log_probabilities[row].tolist()):
+                        if path_log_probability == -np.inf:
+                            break
+                        full_tags = [table.full_tags[full_tag_ids[starts[row, position] + column]] for position, column in enumerate(path)]
+                        sequences.append((self.__restore_sentence(pos_tags_list[index], token_ids[index], full_tags), math.exp(path_log_probability - log_probability[row])))
+                    word_posteriors = iter(word_posteriors)
+                    token_posteriors = [(token[0], [(self.punctuation_tag, 1.0)]) if token_id == table.punctuation_id else (token[0], next(word_posteriors)) for token, token_id in zip(pos_tags_list[index], token_ids[index].tolist())]
+                    results[index] = (token_posteriors, sequences)
+        if stats is not None:
+            stats.time("posteriors", started)
+            stats.count("sentences_decoded", len(pos_tags_list))
+        return results
 
 
 class Tokenizer:
     """A class to tokenize the text and separate it in sentences."""
+    stats = None  # optional Stats object that records the timings // необязательный объект Stats для сбора статистики
+
     def __init__(self, filename=False):
         self.composed_tokens = {}
-
-    def __separate_sentences(self, token_list):
-        """A method to separate the tokenized text in sentences."""
-        token_list = token_list
-        end_of_sentence_markers = ["exclamation mark", "question mark", "period", "new line"]
-        sentences = []
-        current_sentence = []
-        open_citation = False
-        ignore_token = False
-        if token_list[-1][1] not in end_of_sentence_markers:
-            pair = ("\n", "new line")
-            token_list.append(pair)
-        for i, token in enumerate(token_list):
-            if ignore_token:
-                ignore_token = False
-            else:
-                if token[0] == '"':
-                    open_citation = True
-                current_sentence.append(token)
-                if token[1] in end_of_sentence_markers:
-                    try:
-                        if token_list[i + 1][0] == '"' and open_citation:
-                            current_sentence.append(token_list[i + 1])
-                            open_citation = False
-                            ignore_token = True
-                    except:
-                        pass
-                    if len(current_sentence) > 1:
-                        sentences.append(current_sentence)
-                    current_sentence = []
-        return sentences
-
-    def tokenize(self, text):
-        """Regex rules to extract the tokens from the text."""
-        scanner = re.Scanner(
+        # the scanner is compiled once and reused for every text // сканер компилируется один раз
+        self.__scanner = re.Scanner(
             [
                 (r"\n", lambda scanner, token: (token, "new line")),
                 (r'[„”"“”‘’‹›«»]', lambda scanner, token: (token, "quotation mark")),
@@ -247,6 +728,155 @@ class Tokenizer:
                 (r".", lambda scanner, token: (token, "notMatched")),  # ignore unmatched tokens // игнорировать нераспознанные токены
             ]
         )
-        token_list = scanner.scan(text)  # word segmentation // выделение слов
-        sentences = self.__separate_sentences(token_list[0])  # sentence segmentation // сегментация предложений
+        # only the whitespace rules can match whitespace, so the text can be split before a whitespace that follows any other character without changing the tokens
+        # только правила для пробелов совпадают с пробелами, поэтому текст можно разделить перед пробелом, который следует за другим символом
+        self.__last_boundary = re.compile(r".*\S(?=\s)", re.DOTALL)
+
+    def __separate_sentences(self, token_list):
+        """A generator to separate a stream of tokens in sentences. A sentence is yielded as soon as the token that follows its end marker is known."""
+        end_of_sentence_markers = ["exclamation mark", "question mark", "period", "new line"]
+        current_sentence = []
+        open_citation = False
+        end_of_sentence = False
+        for token in self.__close_text(token_list, end_of_sentence_markers):
+            if end_of_sentence:
+                end_of_sentence = False
+                if token[0] == '"' and open_citation:
+                    current_sentence.append(token)
+                    open_citation = False
+                    if len(current_sentence) > 1:
+                        yield current_sentence
+                    current_sentence = []
+                    continue
+                if len(current_sentence) > 1:
+                    yield current_sentence
+                current_sentence = []
+            if token[0] == '"':
+                open_citation = True
+            current_sentence.append(token)
+            if token[1] in end_of_sentence_markers:
+                end_of_sentence = True
+        if end_of_sentence and len(current_sentence) > 1:
+            yield current_sentence
+
+    def __close_text(self, token_list, end_of_sentence_markers):
+        """A helper generator that adds a new line at the end of the text if it does not finish with an end of sentence marker."""
+        token = None
+        for token in token_list:
+            yield token
+        if token is not None and token[1] not in end_of_sentence_markers:
+            yield ("\n", "new line")
+
+    def __scan(self, stream, chunk_size):
+        """A helper generator that reads the text by chunks and scans the part before the last safe boundary of every chunk."""
+        buffer = ""
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            boundary = self.__last_boundary.match(buffer)
+            if boundary is not None:
+                yield from self.__scanner.scan(buffer[:boundary.end()])[0]
+                buffer = buffer[boundary.end():]
+        if buffer:
+            yield from self.__scanner.scan(buffer)[0]
+
+    def tokenize(self, text):
+        """Regex rules to extract the tokens from the text."""
+        stats = self.stats
+        if stats is not None:
+            started = stats.clock()
+        token_list = self.__scanner.scan(text)  # word segmentation // выделение слов
+        sentences = list(self.__separate_sentences(token_list[0]))  # sentence segmentation // сегментация предложений
+        if stats is not None:
+            stats.time("tokenize", started)
+            stats.count("sentences_tokenized", len(sentences))
+            stats.count("tokens_tokenized", sum(len(sentence) for sentence in sentences))
+        return sentences
+
+    def iter_sentences(self, stream, chunk_size=65536):
+        """A generator that reads a text file object incrementally and yields its tokenized sentences as soon as they end. It gives the same sentences as tokenize."""
+        sentences = self.__separate_sentences(self.__scan(stream, chunk_size))
+        if self.stats is not None:
+            return self.__timed(sentences, self.stats)
         return sentences
+
+    def __timed(self, sentences, stats):
+        """A helper generator that records the time spent reading and tokenizing every sentence, but not the time spent by the caller between sentences."""
+        while True:
+            started = stats.clock()
+            sentence = next(sentences, None)
+            if sentence is None:
+                return
+            stats.time("tokenize", started)
+            stats.count("sentences_tokenized")
+            stats.count("tokens_tokenized", len(sentence))
+            yield sentence
+
+
+class Tagger(object):
+    """A class that puts together the tokenizer, the emission and the transition probabilities to tag whole batches of sentences."""
+    stats = None
+
+    def __init__(self, emission, transition, tokenizer=None, stats=None):
+        if emission.log_space != transition.log_space:
+            raise ValueError("The emission and the transition probabilities must both be in log space or both be probabilities.")
+        self.emission = emission
+        self.transition = transition
+        self.tokenizer = tokenizer if tokenizer is not None else Tokenizer()
+        if stats is not None:
+            self.instrument(stats)
+
+    @classmethod
+    def from_model(cls, model, tokenizer=None, stats=None):
+        """Creates the tagger from a binary model file, which is opened only once for both the emission and the transition probabilities."""
+        if isinstance(model, str):
+            model = read_model(model)
+        return cls(Emission.from_model(model, log_space=True), Transition.from_model(model, log_space=True), tokenizer, stats)
+
+    def instrument(self, stats):
+        """Attaches a Stats object to the tokenizer, the emission and the transition probabilities (or detaches it if stats is None)."""
+        self.tokenizer.stats = stats
+        self.emission.stats = stats
+        self.transition.stats = stats
+        self.stats = stats
+
+    def tag_batch(self, sentences, metric=None, batch_size=256, beam=None, top_k=None, anchors=False):
+        """A method to tag a list of tokenized sentences. Returns the same sequences as tagging the sentences one by one.
+        The candidate tags of the tokens are looked up as integer ids of the candidate table of the decoder, and the strings of the tags are only built for the output."""
+        table = self.transition.candidate_table(top_k)
+        token_ids = [self.emission.get_entry_ids(sentence, table, metric) for sentence in sentences]
+        return self.transition.get_sequences(sentences, batch_size, beam, top_k, anchors, token_ids=token_ids)
+
+    def tag(self, text, metric=None, batch_size=256, beam=None, top_k=None, anchors=False):
+        """A method to tokenize a text and tag all its sentences as a batch."""
+        return self.tag_batch(self.tokenizer.tokenize(text), metric, batch_size, beam, top_k, anchors)
+
+    def posteriors_batch(self, sentences, metric=None, n_best=1, batch_size=256, top_k=None):
+        """A method to get the posterior probabilities of the candidate tags and the n_best most probable sequences of a list of tokenized sentences (see Transition.get_posteriors)."""
+        table = self.transition.candidate_table(top_k)
+        token_ids = [self.emission.get_entry_ids(sentence, table, metric) for sentence in sentences]
+        return self.transition.get_posteriors(sentences, n_best, batch_size, top_k, token_ids=token_ids)
+
+    def posteriors(self, text, metric=None, n_best=1, batch_size=256, top_k=None):
+        """A method to tokenize a text and get the posteriors of all its sentences as a batch."""
+        return self.posteriors_batch(self.tokenizer.tokenize(text), metric, n_best, batch_size, top_k)
+
+
+def model_files(data_folder):
+    """Returns the files of the model that load_tagger opens: the binary model if the folder contains one, otherwise the json files."""
+    model_file = data_folder + "model.bin"
+    if os.path.exists(model_file):
+        return [model_file]
+    return [data_folder + "postag_distribution.json", data_folder + "emission_probabilities.json", data_folder + "transition_probabilities.json"]
+
+
+def load_tagger(data_folder, mapped=True):
+    """Loads the binary model if the folder contains one (memory-mapped, or read into memory if mapped is False), otherwise the json files."""
+    filenames = model_files(data_folder)
+    if len(filenames) == 1:
+        return Tagger.from_model(read_model(filenames[0], mapped))
+    emission = Emission(filenames[0], filenames[1], log_space=True)
+    transition = Transition(filenames[2], log_space=True)
+    return Tagger(emission, transition)
@@ -1,9 +1,29 @@
 import os
 import json
+import glob
 import argparse
 import csv
-from sklearn.metrics import multilabel_confusion_matrix
-from tagger import Tokenizer, Emission, Transition
+import numpy as np
+from tagger import Emission, Tagger, load_tagger, model_files
+from stats import Stats
+from train import new_counts, add_sentences, extract_sentences, model_from_counts
+from model import read_model, build_model, quantize_model, QUANTIZATION_PRECISIONS
+
+
+def multilabel_confusion_matrix(true_postags, predicted_postags, labels):
+    """Returns a [[TN, FP], [FN, TP]] confusion matrix for every label, comparing the observed and the predicted tags one by one."""
+    if len(true_postags) != len(predicted_postags):
+        raise ValueError("Found {} observed tags but {} predicted tags.".format(len(true_postags), len(predicted_postags)))
+    label_index = {label: i for i, label in enumerate(labels)}
+    true_ids = np.array([label_index.get(postag, -1) for postag in true_postags], dtype=np.intp)
+    predicted_ids = np.array([label_index.get(postag, -1) for postag in predicted_postags], dtype=np.intp)
+    tp = np.bincount(true_ids[(true_ids == predicted_ids) & (true_ids >= 0)], minlength=len(labels))
+    true_totals = np.bincount(true_ids[true_ids >= 0], minlength=len(labels))
+    predicted_totals = np.bincount(predicted_ids[predicted_ids >= 0], minlength=len(labels))
+    fp = predicted_totals - tp
+    fn = true_totals - tp
+    tn = len(true_postags) - tp - fp - fn
+    return np.stack([tn, fp, fn, tp], axis=1).reshape(-1, 2, 2)
 
 
 def divide(numerator, denominator):
@@ -23,28 +43,164 @@ def f_1(precision, recall):
         return 0
 
 
-def calculate_precision_recall_f(filename, conf_matrix):
+def precision_recall_f(conf_matrix, postag_list):
+    """Returns the rows of the results table (one per tag) and the average precision, recall and f-score."""
+    rows = []
+    precision_list = []
+    recall_list = []
+    f_list = []
+    for i, matrix in enumerate(conf_matrix):
+        tp = int(matrix[1][1])
+        fp = int(matrix[0][1])
+        fn = int(matrix[1][0])
+        precision = divide(tp, fp)
+        precision_list.append(precision)
+        recall = divide(tp, fn)
+        recall_list.append(recall)
+        f = f_1(precision, recall)
+        f_list.append(f)
+        rows.append([postag_list[i], matrix[0][0], matrix[0][1], matrix[1][0], matrix[1][1], precision, recall, f])
+    average_precision = round(sum(precision_list) / len(precision_list), 2)
+    average_recall = round(sum(recall_list) / len(recall_list), 2)
+    average_f = round(sum(f_list) / len(f_list), 2)
+    return rows, (average_precision, average_recall, average_f)
+
+
+def calculate_precision_recall_f(filename, conf_matrix, postag_list, parts=None):
+    """Writes the results of every tag and their average. If the evaluation has several parts (test files or folds), their averages are written below."""
     with open(filename, "w") as csv_file:
         writer = csv.writer(csv_file)
         writer.writerow(["Tег", "TN", "FP (I err)", "FN (II err)", "TP", "Precision", "Recall", "F-score",])
-        precision_list = []
-        recall_list = []
-        f_list = []
-        for i, matrix in enumerate(conf_matrix):
-            tp = int(matrix[1][1])
-            fp = int(matrix[0][1])
-            fn = int(matrix[1][0])
-            precision = divide(tp, fp)
-            precision_list.append(precision)
-            recall = divide(tp, fn)
-            recall_list.append(recall)
-            f = f_1(precision, recall)
-            f_list.append(f)
-            writer.writerow([postag_list[i], matrix[0][0], matrix[0][1], matrix[1][0], matrix[1][1], precision, recall, f])
-        average_precision = round(sum(precision_list) / len(precision_list), 2)
-        average_recall = round(sum(recall_list) / len(recall_list), 2)
-        average_f = round(sum(f_list) / len(f_list), 2)
-        writer.writerow(["Average", "", "", "", "", average_precision, average_recall, average_f])
+        rows, averages = precision_recall_f(conf_matrix, postag_list)
+        writer.writerows(rows)
+        writer.writerow(["Average", "", "", "", "", *averages])
+        if parts:
+            writer.writerow([])
+            writer.writerow(["Part", "", "", "", "", "Precision", "Recall", "F-score"])
+            for name, part_averages in parts:
+                writer.writerow([name, "", "", "", "", *part_averages])
+    return averages
+
+
+def accuracy(true_postags, predicted_postags):
+    """Returns the proportion of tags predicted correctly."""
+    if not true_postags:
+        return 0
+    return sum(1 for true_postag, predicted_postag in zip(true_postags, predicted_postags) if true_postag == predicted_postag) / len(true_postags)
+
+
+def load_model(data_folder):
+    """Returns the arrays of the model of the folder: the binary model if the folder contains one, otherwise the model built from the json files."""
+    filenames = model_files(data_folder)
+    if len(filenames) == 1:
+        return read_model(filenames[0])
+    data = []
+    for filename in filenames:
+        with open(filename) as json_file:
+            data.append(json.load(json_file))
+    return build_model(*data)
+
+
+def postag_labels(true_postags):
+    """Returns the tags in the order of their first appearance."""
+    return list(dict.fromkeys(true_postags))
+
+
+def tag_sentences(tagger, sentences, metric=None):
+    """Tags the annotated sentences as a single batch and returns the lists of observed and predicted tags (without punctuation marks)."""
+    true_postags = []
+    predicted_postags = []
+    tokenized_sentences = []
+    for sentence in sentences:
+        txt = sentence['srn']
+        parse = sentence['parse']
+        for p in parse:
+            postag = p["postag"]
+            if postag != "PNCT":
+                true_postags.append(postag)
+        tokenized_sentences.extend(tagger.tokenizer.tokenize(txt))
+    # all the sentences are tagged as a single batch
+    # все предложения размечаются одним пакетом
+    for tokens, disambiguated_sequence in zip(tokenized_sentences, tagger.tag_batch(tokenized_sentences, metric)):
+        if disambiguated_sequence is False:
+            # the words of a sentence that could not be disambiguated count as untagged
+            # слова предложения, которое не удалось разрешить, считаются неразмеченными
+            disambiguated_sequence = [(token[0], "") for token in tokens if token[1] in ["word", "acronym", "number"]]
+        for token in disambiguated_sequence:
+            predicted_tag = token[1]
+            if predicted_tag != "PNCT":
+                predicted_postags.append(predicted_tag)
+    return true_postags, predicted_postags
+
+
+# state of the current worker process, set once by its initializer
+# состояние текущего рабочего процесса, задается один раз при его инициализации
+worker_tagger = None
+worker_sentences = None
+worker_folds = None
+worker_stats = None
+worker_metric = None
+worker_precision = None
+
+
+def init_file_worker(data_folder, collect_stats, metric=None, precision=None):
+    global worker_tagger, worker_stats, worker_metric
+    worker_metric = metric
+    worker_stats = Stats() if collect_stats else None
+    if precision is None:
+        worker_tagger = load_tagger(data_folder)
+    else:
+        worker_tagger = Tagger.from_model(quantize_model(load_model(data_folder), precision))
+    worker_tagger.instrument(worker_stats)
+
+
+def init_fold_worker(sentences, folds, collect_stats, metric=None, precision=None):
+    global worker_sentences, worker_folds, worker_stats, worker_metric, worker_precision
+    worker_metric = metric
+    worker_precision = precision
+    worker_sentences = sentences
+    worker_folds = folds
+    worker_stats = Stats() if collect_stats else None
+
+
+def worker_snapshot():
+    if worker_stats is None:
+        return None
+    snapshot = worker_stats.snapshot()
+    worker_stats.reset()
+    return snapshot
+
+
+def evaluate_file(filename):
+    """Tags the sentences of a testing file with the model of the worker."""
+    with open(filename) as json_file:
+        txt = json.load(json_file)
+    true_postags, predicted_postags = tag_sentences(worker_tagger, txt['content'], worker_metric)
+    return true_postags, predicted_postags, worker_snapshot()
+
+
+def evaluate_fold(fold):
+    """Trains a model in memory on all the folds but one, using the count tables of train.py, and tags the sentences of the remaining fold."""
+    training_sentences = [sentence for i, sentence in enumerate(worker_sentences) if i % worker_folds != fold]
+    testing_sentences = [sentence for i, sentence in enumerate(worker_sentences) if i % worker_folds == fold]
+    counts = new_counts()
+    add_sentences(counts, extract_sentences({"content": training_sentences}))
+    model = model_from_counts(counts)
+    if worker_precision is not None:
+        model = quantize_model(model, worker_precision)
+    tagger = Tagger.from_model(model, stats=worker_stats)
+    true_postags, predicted_postags = tag_sentences(tagger, testing_sentences, worker_metric)
+    return true_postags, predicted_postags, worker_snapshot()
+
+
+def run_evaluation(function, parts, jobs, initializer, initargs):
+    """Evaluates every part in a pool of worker processes (or in this process if there is a single job) and returns the results in the same order."""
+    if jobs <= 1 or len(parts) == 1:
+        initializer(*initargs)
+        return [function(part) for part in parts]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(jobs, len(parts)), initializer=initializer, initargs=initargs) as executor:
+        return list(executor.map(function, parts))
 
 
 if __name__ == "__main__":
@@ -53,37 +209,17 @@ if __name__ == "__main__":
     working_folder = "{}".format(os.getcwd())
 
     parser = argparse.ArgumentParser(description="Script for testing the part-of-speech tagger")
-    parser.add_argument("filename", type=str, help="Full path to the json formated file containing the testing sentences")
+    parser.add_argument("filenames", nargs="*", type=str, help="Full paths to the json formated files containing the testing sentences")
     parser.add_argument("-r", default=None, type=str, dest="readFrom", help="Full path to the folder that contains the statistical data obtained from the training set (it looks into /data if the folder is not specified)")
     parser.add_argument("-w", default=None, type=str, dest="writeTo", help="Specifies the path and filename with the extension .csv to save the test results")
+    parser.add_argument("-k", default=None, type=int, dest="folds", help="Number of folds for cross-validation over the training datasets, instead of testing the trained model on the given files")
+    parser.add_argument("-d", default=None, type=str, dest="datasets", help="Full path to the folder containing the training data for cross-validation (it looks into /datasets if the folder is not specified)")
+    parser.add_argument("-j", default=os.cpu_count(), type=int, dest="jobs", help="Number of worker processes (all the processor cores by default)")
+    parser.add_argument("-m", default=None, choices=Emission.metrics, dest="metric", help="Metric to estimate the tags of the words not found in the training set")
+    parser.add_argument("--stats", default=None, type=str, dest="stats", help="Full path to a file to save the timings of every stage, the unknown words and the decoding failures (Prometheus text if the extension is .prom, json otherwise)")
+    parser.add_argument("-q", default=None, choices=QUANTIZATION_PRECISIONS, dest="quantize", help="Also tests the model quantized to float16 or uint8 log-probabilities and reports how much its accuracy differs from the full precision model")
     args = parser.parse_args()
 
-    # Fast check to detect proper file format
-    # Быстрая проверка для определения правильного формата файла
-    filename = args.filename
-    if filename[-5:] != ".json":
-        raise ValueError("The path does not point to a file with json format")
-
-    # loads json file
-    # загружает файл json
-    try:
-        with open(filename) as json_file:
-            txt = json.load(json_file)
-    except Exception as e:
-        print(e)
-        exit()
-    else:
-        print("Testing set loaded")
-
-
-    # folder with the statistical data in json format
-    # папка со статистическими данными в формате json 
-    data_folder = working_folder + "/data/" if args.readFrom == None else "{}".format(args.readFrom)
-    isExist = os.path.exists(data_folder)
-    if not isExist:
-        raise ValueError("The specified path to the folder containing the json files with the statistical data does not exists.")
-
-  
     # file to save the results from the testing process
     # файл для хранения результатов теста
     results_file = args.writeTo
@@ -92,52 +228,81 @@ if __name__ == "__main__":
             raise ValueError("The file for storing the testing results must have a .csv extension")
     else:         
         results_file = 'results.csv'
-    
-
-    # required files
-    # обязательных файла
-    postag_dist = data_folder + "postag_distribution.json"
-    emission_prob = data_folder + "emission_probabilities.json"
-    transition_prob = data_folder + "transition_probabilities.json"
-
-    # object initialization
-    # инициализация объекта 
-    tokenizer = Tokenizer()
-    emission = Emission(postag_dist, emission_prob)
-    transition = Transition(transition_prob)
-
-    # part-of-speech tag lists (observed and predicted)
-    # списки тегов части речи 
-    true_postags = []
-    predicted_postags = []
-    postag_list = []
 
-    # process for marking the text with part-of-speech tags
-    # процесс разметки текста частями речи
+    stats = Stats() if args.stats != None else None
 
-    sentences = txt['content']
-    for sentence in sentences:
-        txt = sentence['srn']
-        parse = sentence['parse']
-        for p in parse:
-            postag = p["postag"]
-            if postag != "PNCT":
-                true_postags.append(postag)
-                if postag not in postag_list:
-                    postag_list.append(postag)
-        tokenized_sentences = tokenizer.tokenize(txt)
-        for sentence in tokenized_sentences:
-            tagged_tokens = emission.get_emission_probabilities(sentence)  # assigns the possible tags to a word form
-            disambiguated_sequence = transition.get_sequence(tagged_tokens)  # disambiguates the assigned tags in the context of the sentence
-            for token in disambiguated_sequence:
-                predicted_tag = token[1]
-                if predicted_tag != "PNCT":
-                    predicted_postags.append(predicted_tag)
+    if args.folds != None:
+        # cross-validation: the sentences of the datasets are split in k folds and every fold is tagged by a model trained on the others
+        # перекрестная проверка: предложения наборов данных делятся на k частей, и каждая часть размечается моделью, обученной на остальных
+        if args.folds < 2:
+            raise ValueError("Cross-validation needs at least 2 folds.")
+        dataset_folder = working_folder + "/datasets/" if args.datasets == None else "{}".format(args.datasets)
+        if not os.path.exists(dataset_folder):
+            raise ValueError("The specified path to the folder containing the json files with the training data does not exists.")
+        sentences = []
+        for filename in sorted(glob.glob(os.path.join(dataset_folder, "*.json"))):
+            with open(filename) as json_file:
+                sentences.extend(json.load(json_file)['content'])
+        print("{} sentences loaded for {}-fold cross-validation".format(len(sentences), args.folds))
+        part_names = ["Fold {}".format(fold + 1) for fold in range(args.folds)]
+        evaluation = (evaluate_fold, list(range(args.folds)), init_fold_worker, (sentences, args.folds))
+    else:
+        if not args.filenames:
+            raise ValueError("Specify the json files with the testing sentences or the number of folds for cross-validation (-k).")
+        # Fast check to detect proper file format
+        # Быстрая проверка для определения правильного формата файла
+        for filename in args.filenames:
+            if filename[-5:] != ".json":
+                raise ValueError("The path does not point to a file with json format")
+
+        # folder with the statistical data in json format
+        # папка со статистическими данными в формате json 
+        data_folder = working_folder + "/data/" if args.readFrom == None else "{}".format(args.readFrom)
+        isExist = os.path.exists(data_folder)
+        if not isExist:
+            raise ValueError("The specified path to the folder containing the json files with the statistical data does not exists.")
+        print("Testing {} file(s)".format(len(args.filenames)))
+        part_names = [os.path.basename(filename) for filename in args.filenames]
+        evaluation = (evaluate_file, args.filenames, init_file_worker, (data_folder,))
+
+    function, evaluated_parts, initializer, initargs = evaluation
+    results = run_evaluation(function, evaluated_parts, args.jobs, initializer, initargs + (stats is not None, args.metric))
+
+    # confusion matrices of every part and of all the parts together
+    # матрицы путаницы каждой части и всех частей вместе
+    true_postags = []
+    predicted_postags = []
+    parts = []
+    for name, (part_true_postags, part_predicted_postags, snapshot) in zip(part_names, results):
+        true_postags.extend(part_true_postags)
+        predicted_postags.extend(part_predicted_postags)
+        if snapshot is not None:
+            stats.merge(snapshot)
+        part_labels = postag_labels(part_true_postags)
+        _, part_averages = precision_recall_f(multilabel_confusion_matrix(part_true_postags, part_predicted_postags, labels=part_labels), part_labels)
+        parts.append((name, part_averages))
+        if len(results) > 1:
+            print("{}: precision {}, recall {}, f-score {}".format(name, *part_averages))
 
     # confusion matrix and testing results
     # матрица путаницы и результаты тестирования 
+    postag_list = postag_labels(true_postags)
     confusion_matrix = multilabel_confusion_matrix(true_postags, predicted_postags, labels=postag_list)
-    calculate_precision_recall_f(results_file, confusion_matrix)
+    averages = calculate_precision_recall_f(results_file, confusion_matrix, postag_list, parts if len(parts) > 1 else None)
+    if len(results) > 1:
+        print("Aggregate: precision {}, recall {}, f-score {}".format(*averages))
+    if args.quantize != None:
+        # the same parts are tagged again with the quantized model and compared token by token
+        # те же части размечаются снова квантованной моделью и сравниваются токен за токеном
+        quantized_predicted_postags = []
+        for _, part_predicted_postags, _ in run_evaluation(function, evaluated_parts, args.jobs, initializer, initargs + (False, args.metric, args.quantize)):
+            quantized_predicted_postags.extend(part_predicted_postags)
+        full_accuracy = accuracy(true_postags, predicted_postags)
+        quantized_accuracy = accuracy(true_postags, quantized_predicted_postags)
+        changed = sum(1 for predicted_postag, quantized_postag in zip(predicted_postags, quantized_predicted_postags) if predicted_postag != quantized_postag)
+        print("Accuracy: full precision {:.4f}, {} {:.4f} (difference {:+.4f}); {} of {} tags changed".format(full_accuracy, args.quantize, quantized_accuracy, quantized_accuracy - full_accuracy, changed, len(predicted_postags)))
     print('Done')
     print("Testing results saved to file: {}".format(results_file))
-
+    if stats is not None:
+        stats.save(args.stats)
+        print("Statistics saved to file: {}".format(args.stats))
@@ -0,0 +1,99 @@
+import io
+import os
+import json
+import glob
+import unittest
+from tagger import Tokenizer, load_tagger
+
+
+# texts whose sentence delimiters (repeated marks, quotes that close a citation, acronyms, numbers, new lines) and multibyte characters are cut by the chunks at every position
+# тексты, разделители предложений которых (повторяющиеся знаки, кавычки, закрывающие цитату, сокращения, числа, новые строки) и многобайтовые символы разрезаются частями в каждой позиции
+TEXTS = [
+    "Mi lobi yu. Yu lobi mi!",
+    'A taki: "Kon na oso." Mi go... Fa yu tan?! Bun!!. Wan, tu; dri.',
+    "Den U.S.A. ben de 3.14 noso 1,5 kilo.\nÈn a bigi ôso – ẽé \U0001F600 de.\r\n\r\nNa en",
+    '"Kon!" "Go?"\n\n\n  A (bigi) oso & 2² €5 - tu.',
+    "   \n",
+    "",
+]
+# the folder of the tests, with the bundled model and testing texts
+# папка тестов с прилагаемой моделью и тестовыми текстами
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def testing_texts():
+    """Returns the texts of the sentences of the bundled testing files."""
+    texts = []
+    for filename in sorted(glob.glob(os.path.join(FOLDER, "testing", "test_text*.json"))):
+        with open(filename, encoding="utf-8") as json_file:
+            texts.extend(sentence["srn"] for sentence in json.load(json_file)["content"])
+    return texts
+
+
+class IterSentencesTest(unittest.TestCase):
+    def setUp(self):
+        self.tokenizer = Tokenizer()
+
+    def check(self, text):
+        expected = self.tokenizer.tokenize(text)
+        for chunk_size in [1, 2, 3, 5, 8, 65536]:
+            with self.subTest(text=text[:20], chunk_size=chunk_size):
+                self.assertEqual(list(self.tokenizer.iter_sentences(io.StringIO(text), chunk_size)), expected)
+
+    def test_chunk_boundaries(self):
+        for text in TEXTS:
+            self.check(text)
+        self.check(" ".join(TEXTS))
+
+    def test_testing_texts(self):
+        texts = testing_texts()
+        self.assertTrue(texts)
+        self.check("\n".join(texts))
+        self.check(" ".join(texts))
+
+    def test_multibyte_file(self):
+        # the file is decoded through a small buffer, so the utf-8 sequences are split between reads
+        # файл декодируется через маленький буфер, поэтому последовательности utf-8 разделяются между чтениями
+        text = " ".join(TEXTS)
+        for chunk_size in [1, 3, 4096]:
+            with self.subTest(chunk_size=chunk_size):
+                stream = io.TextIOWrapper(io.BufferedReader(io.BytesIO(text.encode("utf-8")), buffer_size=1), encoding="utf-8", newline="")
+                self.assertEqual(list(self.tokenizer.iter_sentences(stream, chunk_size)), self.tokenizer.tokenize(text))
+
+    def test_incremental(self):
+        # the first sentence is given before the rest of the text is read
+        # первое предложение выдается до того, как прочитан остальной текст
+        stream = io.StringIO("Mi lobi yu. " + "Yu lobi mi. " * 1000)
+        sentences = self.tokenizer.iter_sentences(stream, 16)
+        self.assertEqual(next(sentences), [("Mi", "word"), ("lobi", "word"), ("yu", "word"), (".", "period")])
+        self.assertLess(stream.tell(), 100)
+
+
+class GetSequencesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tagger = load_tagger(os.path.join(FOLDER, "data", ""))
+        sentences = [sentence for text in testing_texts() for sentence in cls.tagger.tokenizer.tokenize(text)]
+        cls.tagged_sentences = [cls.tagger.emission.get_emission_probabilities(sentence) for sentence in sentences]
+
+    def check(self, **options):
+        transition = self.tagger.transition
+        expected = [transition.get_sequence(tagged_tokens, **options) for tagged_tokens in self.tagged_sentences]
+        for batch_size in [1, 7, 256]:
+            with self.subTest(batch_size=batch_size, **options):
+                self.assertEqual(transition.get_sequences(self.tagged_sentences, batch_size, **options), expected)
+        return expected
+
+    def test_batched(self):
+        self.assertTrue(self.tagged_sentences)
+        self.check()
+
+    def test_anchors(self):
+        # the sentences split at the anchors get the same tags as the whole sentences
+        # предложения, разделенные по опорным словам, получают те же теги, что и целые предложения
+        self.assertEqual(self.check(anchors=True), self.check())
+        self.assertEqual(self.check(anchors=True, top_k=2), self.check(top_k=2))
+
+
+if __name__ == "__main__":
+    unittest.main()
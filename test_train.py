@@ -0,0 +1,91 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+from train import iter_json_content, iter_dataset, dataset_shards, count_shard, new_counts, add_sentences, extract_sentences
+
+
+# sentences with escapes, quotes, delimiters inside strings, multibyte characters and numbers, which the chunks of the reader cut at every position
+# предложения с экранированием, кавычками, разделителями внутри строк, многобайтовыми символами и числами, которые части чтения разрезают в каждой позиции
+SENTENCES = [
+    {"srn": "Mi lobi yu.", "parse": [{"token": "Mi", "postag": "PRN"}, {"token": "lobi", "postag": "VB"}, {"token": "yu", "postag": "PRN"}, {"token": ".", "postag": "PNCT"}]},
+    {"srn": "A taki: \"Kon, ]} {[ \\ drape!\"", "parse": [{"token": "A", "postag": "PRN"}, {"token": "taki", "postag": "VB"}, {"token": "\"", "postag": "PNCT"}, {"token": "kon\\", "postag": "VB"}]},
+    {"srn": "Èn a bigi ôso – ẽé\U0001F600  ", "id": 12345.5e-1, "parse": [{"token": "Èn", "postag": "CC"}, {"token": "ôso", "postag": "NN"}, {"token": "\U0001F600", "postag": "UH"}]},
+    {"srn": "", "parse": []},
+]
+
+
+class IterJsonContentTest(unittest.TestCase):
+    def check(self, text):
+        expected = json.loads(text).get("content", [])
+        for chunk_size in [1, 2, 3, 5, 7, 64, 65536]:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_json_content(io.StringIO(text), chunk_size)), expected)
+
+    def test_chunk_boundaries(self):
+        self.check(json.dumps({"content": SENTENCES}))
+        self.check(json.dumps({"content": SENTENCES}, ensure_ascii=False, indent=4))
+
+    def test_other_keys(self):
+        self.check(json.dumps({"name": "a \"content\": [1]", "size": 10, "content": SENTENCES, "notes": [{"content": []}]}, ensure_ascii=False))
+
+    def test_empty(self):
+        self.check('{}')
+        self.check(' { "content" : [ ] } ')
+
+    def test_multibyte_file(self):
+        # the file is decoded through a small buffer, so the utf-8 sequences are split between reads
+        # файл декодируется через маленький буфер, поэтому последовательности utf-8 разделяются между чтениями
+        data = json.dumps({"content": SENTENCES}, ensure_ascii=False).encode("utf-8")
+        for chunk_size in [1, 3, 4096]:
+            with self.subTest(chunk_size=chunk_size):
+                stream = io.TextIOWrapper(io.BufferedReader(io.BytesIO(data), buffer_size=1), encoding="utf-8")
+                self.assertEqual(list(iter_json_content(stream, chunk_size)), SENTENCES)
+
+    def test_invalid(self):
+        for text in ['[]', '{"content": [1, 2', '{"content": [1 2]}', '{"content": [{"a": }]}']:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    list(iter_json_content(io.StringIO(text), 3))
+
+
+class IterDatasetTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.expected = extract_sentences({"content": SENTENCES * 3})
+
+    def write(self, name, text):
+        filename = os.path.join(self.folder.name, name)
+        with open(filename, "w", encoding="utf-8") as outfile:
+            outfile.write(text)
+        return filename
+
+    def test_json(self):
+        filename = self.write("dataset.json", json.dumps({"content": SENTENCES * 3}, ensure_ascii=False))
+        self.assertEqual(list(iter_dataset(filename)), self.expected)
+
+    def test_jsonl_shards(self):
+        # the byte ranges of the shards cut the lines (and their multibyte characters) anywhere, and every line is still read once
+        # диапазоны байтов частей разрезают строки (и их многобайтовые символы) где угодно, и каждая строка все равно читается один раз
+        filename = self.write("dataset.jsonl", "\n".join(json.dumps(sentence, ensure_ascii=False) for sentence in SENTENCES * 3) + "\n\n")
+        for shard_size in [1, 2, 7, 50, 10 ** 6]:
+            with self.subTest(shard_size=shard_size):
+                shards = list(dataset_shards(filename, shard_size))
+                self.assertEqual([sentence for _, start, end, _ in shards for sentence in iter_dataset(filename, start, end)], self.expected)
+
+    def test_json_shards(self):
+        filename = self.write("dataset.json", json.dumps({"content": SENTENCES * 3}, ensure_ascii=False))
+        expected = new_counts()
+        add_sentences(expected, self.expected)
+        for shard_sentences in [1, 5, 100]:
+            with self.subTest(shard_sentences=shard_sentences):
+                shards = list(dataset_shards(filename, shard_sentences=shard_sentences))
+                self.assertEqual(len(shards), -(-len(self.expected) // shard_sentences))
+                counts = [count_shard(shard) for shard in shards]
+                self.assertEqual(sum((shard_counts["trigrams"] for shard_counts in counts), type(expected["trigrams"])()), expected["trigrams"])
+
+
+if __name__ == "__main__":
+    unittest.main()
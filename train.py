@@ -2,8 +2,9 @@ import os
 import argparse
 import json
 import glob
-import numpy as np
-import pandas as pd
+import csv
+from collections import Counter
+from model import build_model, write_model
 
 # Tags to specify sentence start and sentence end
 # Теги для указания начала и конца предложения
@@ -11,21 +12,436 @@ SENTENCE_START_TAG = "S"
 SENTENCE_PRESTART_TAG = "*"
 SENTENCE_END_TAG = "E"
 
-# function for calculating the part-of-speech transition probabilities
-# функция для вычисления вероятности переходов частей речи
-def t_given_uv(t, u, v, train_bag):
-    tags = [
-        pair[1] for pair in train_bag
-    ]  # only tags are selected // выбераем только теги
-    count_uv = 0
-    count_t_uv = 0
-    for index in range(len(tags) - 1):
-        if tags[index] == u and tags[index + 1] == v:
-            count_uv += 1
-    for index in range(len(tags) - 2):
-        if tags[index] == u and tags[index + 1] == v and tags[index + 2] == t:
-            count_t_uv += 1
-    return (count_t_uv, count_uv)
+# approximate size in bytes of the shards of a jsonl dataset counted by every worker process
+# приблизительный размер в байтах частей набора данных jsonl, подсчитываемых каждым рабочим процессом
+SHARD_SIZE = 8 * 2 ** 20
+
+# number of sentences of a json dataset sent together to a worker process
+# количество предложений набора данных json, передаваемых вместе рабочему процессу
+SHARD_SENTENCES = 8192
+
+# function for counting the part-of-speech unigrams, bigrams and trigrams in a single pass over the sentences
+# функция для подсчета униграмм, биграмм и триграмм частей речи за один проход по предложениям
+def count_tag_ngrams(sentences):
+    unigrams = Counter()
+    bigrams = Counter()
+    trigrams = Counter()
+    for sentence in sentences:
+        tags = [
+            pair[1] for pair in sentence
+        ]  # only tags are selected // выбераем только теги
+        unigrams.update(tags)
+        bigrams.update(zip(tags, tags[1:]))
+        trigrams.update(zip(tags, tags[1:], tags[2:]))
+    return unigrams, bigrams, trigrams
+
+
+# function for extracting the pairs word-form and part-of-speech tag of a sentence, with the sentence start and end tags
+# функция для извлечения словоформ и частей речи предложения с тегами начала и конца предложения
+def sentence_pairs(sentence):
+    l = [(SENTENCE_PRESTART_TAG, SENTENCE_PRESTART_TAG), (SENTENCE_START_TAG, SENTENCE_START_TAG)]
+    for i in sentence['parse']:
+        if i['postag'] != 'PNCT':
+            l.append((i['token'], i['postag']))
+    l.append((SENTENCE_END_TAG, SENTENCE_END_TAG))
+    return l
+
+
+# function for extracting the pairs word-form and part-of-speech tag of every sentence of a dataset
+# функция для извлечения словоформ и частей речи каждого предложения набора данных
+def extract_sentences(data):
+    return [sentence_pairs(sentence) for sentence in data['content']]
+
+
+# generator that yields the elements of the list "content" of a json dataset one at a time, reading the file by chunks, so the whole dataset is never in memory
+# генератор, который выдает элементы списка "content" набора данных json по одному, читая файл частями, чтобы весь набор данных никогда не находился в памяти
+def iter_json_content(stream, chunk_size=65536):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    index = 0
+    eof = False
+
+    def fill():
+        # reads the next chunk, dropping the part of the buffer that was already parsed
+        # читает следующую часть, отбрасывая уже разобранную часть буфера
+        nonlocal buffer, index, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[index:] + chunk
+        index = 0
+
+    def next_character():
+        # skips the whitespace and returns the next character without consuming it ("" at the end of the file)
+        # пропускает пробелы и возвращает следующий символ, не поглощая его ("" в конце файла)
+        nonlocal index
+        while True:
+            while index < len(buffer) and buffer[index].isspace():
+                index += 1
+            if index < len(buffer) or eof:
+                return buffer[index] if index < len(buffer) else ""
+            fill()
+
+    def expect(characters):
+        nonlocal index
+        character = next_character()
+        if character == "" or character not in characters:
+            raise ValueError("Invalid json dataset: expected one of {} but found {!r}.".format(" ".join(characters), character))
+        index += 1
+        return character
+
+    def value():
+        # decodes the next value; a value that is not followed by a delimiter may be truncated (a number cut by the end of the chunk), so it is decoded again with more text
+        # декодирует следующее значение; значение без следующего разделителя может быть обрезано (число на границе части), поэтому оно декодируется снова с большим текстом
+        nonlocal index
+        next_character()
+        while True:
+            try:
+                result, end = decoder.raw_decode(buffer, index)
+                if eof or (end < len(buffer) and (buffer[end] in ",:]}" or buffer[end].isspace())):
+                    index = end
+                    return result
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Invalid json dataset: a value could not be decoded.")
+            fill()
+
+    expect("{")
+    if next_character() == "}":
+        return
+    while True:
+        key = value()
+        expect(":")
+        if key == "content":
+            expect("[")
+            if next_character() == "]":
+                index += 1
+            else:
+                while True:
+                    yield value()
+                    if expect(",]") == "]":
+                        break
+        else:
+            value()
+        if expect(",}") == "}":
+            return
+
+
+# generator that yields the pairs word-form and part-of-speech tag of every sentence of a dataset file, one sentence at a time
+# the dataset is either a json file with the list "content" or a jsonl file with one sentence (with its "parse") per line
+# of a jsonl file, only the lines that start between the bytes start and end are read
+# генератор, который выдает словоформы и части речи каждого предложения файла набора данных, по одному предложению
+# набор данных - это файл json со списком "content" или файл jsonl с одним предложением (с его "parse") в каждой строке
+# из файла jsonl читаются только строки, которые начинаются между байтами start и end
+def iter_dataset(filename, start=0, end=None):
+    if filename.endswith(".jsonl"):
+        with open(filename, "rb") as infile:
+            if start > 0:
+                # the line that contains the byte before start belongs to the previous shard
+                # строка, содержащая байт перед start, принадлежит предыдущей части
+                infile.seek(start - 1)
+                infile.readline()
+            position = infile.tell()
+            for line in infile:
+                if end is not None and position >= end:
+                    break
+                position += len(line)
+                if line.strip():
+                    yield sentence_pairs(json.loads(line))
+    else:
+        with open(filename, encoding="utf-8") as infile:
+            for sentence in iter_json_content(infile):
+                yield sentence_pairs(sentence)
+
+
+# generator that splits a dataset file into the shards counted by the worker processes: byte ranges of about shard_size bytes of a jsonl file, which every worker reads by itself,
+# or batches of shard_sentences sentences of a json file, which is read here and streamed to the workers, since it cannot be split without parsing it
+# генератор, разбивающий файл набора данных на части, подсчитываемые рабочими процессами: диапазоны байтов около shard_size байт файла jsonl, которые каждый процесс читает сам,
+# или пакеты по shard_sentences предложений файла json, который читается здесь и передается процессам, так как его нельзя разделить без разбора
+def dataset_shards(filename, shard_size=SHARD_SIZE, shard_sentences=SHARD_SENTENCES):
+    if filename.endswith(".jsonl"):
+        size = os.path.getsize(filename)
+        for start in range(0, max(size, 1), shard_size):
+            yield filename, start, min(start + shard_size, size), None
+        return
+    sentences = []
+    shards = 0
+    try:
+        with open(filename, encoding="utf-8") as infile:
+            for sentence in iter_json_content(infile):
+                sentences.append(sentence)
+                if len(sentences) == shard_sentences:
+                    yield filename, 0, None, sentences
+                    sentences = []
+                    shards += 1
+    except ValueError as e:
+        raise ValueError("The dataset {} could not be read: {}".format(filename, e))
+    # a dataset without sentences still has a shard, so it is recorded as counted
+    # набор данных без предложений все равно имеет часть, чтобы он был отмечен как подсчитанный
+    if sentences or shards == 0:
+        yield filename, 0, None, sentences
+
+
+# function for expanding the file names and glob patterns given in the command line into the list of dataset files
+# функция для раскрытия имен файлов и шаблонов glob из командной строки в список файлов наборов данных
+def dataset_files(patterns):
+    filenames = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise ValueError("No dataset matches {}.".format(pattern))
+        filenames.extend(filename for filename in matches if filename not in filenames)
+    return filenames
+
+
+# function for creating the empty count tables of the model
+# функция для создания пустых таблиц частот модели
+def new_counts():
+    return {
+        "datasets": [],         # names of the datasets already counted / названия уже учтенных наборов данных
+        "words": {},            # frequency of word-forms under each part-of-speech tag / частота словоформ по тегам
+        "unigrams": Counter(),
+        "bigrams": Counter(),
+        "trigrams": Counter(),
+    }
+
+
+# function for adding the sentences of a dataset to the count tables; the sentences are read only once, so they can be streamed from a generator
+# функция для добавления предложений набора данных в таблицы частот; предложения читаются один раз, поэтому их можно передавать генератором
+def add_sentences(counts, word_postag_pairs):
+    dictionary = counts["words"]
+    sentences = []
+    for sentence in word_postag_pairs:
+        for tup in sentence:
+            token = tup[0].lower()
+            if token not in ["*", "s", "e"]:
+                postag = tup[1]
+                words = dictionary.get(postag)
+                if words is None:
+                    words = dictionary[postag] = {}
+                words[token] = words.get(token, 0) + 1
+        sentences.append(sentence)
+        # the n-grams are counted by batches of sentences, so only a batch is kept in memory
+        # n-граммы подсчитываются пакетами предложений, поэтому в памяти хранится только один пакет
+        if len(sentences) == 1024:
+            add_tag_ngrams(counts, sentences)
+            sentences = []
+    add_tag_ngrams(counts, sentences)
+
+
+def add_tag_ngrams(counts, sentences):
+    unigrams, bigrams, trigrams = count_tag_ngrams(sentences)
+    counts["unigrams"].update(unigrams)
+    counts["bigrams"].update(bigrams)
+    counts["trigrams"].update(trigrams)
+
+
+# function for adding the count tables of a shard (counted by a worker process) to the count tables of the model
+# функция для добавления таблиц частот части (подсчитанной рабочим процессом) к таблицам частот модели
+def merge_counts(counts, shard_counts):
+    dictionary = counts["words"]
+    for postag, shard_words in shard_counts["words"].items():
+        words = dictionary.get(postag)
+        if words is None:
+            dictionary[postag] = dict(shard_words)
+            continue
+        for token, count in shard_words.items():
+            words[token] = words.get(token, 0) + count
+    counts["unigrams"].update(shard_counts["unigrams"])
+    counts["bigrams"].update(shard_counts["bigrams"])
+    counts["trigrams"].update(shard_counts["trigrams"])
+
+
+# function run by the worker processes: counts a shard of a dataset (its byte range or its sentences) into its own count tables
+# функция рабочих процессов: подсчитывает часть набора данных (ее диапазон байтов или ее предложения) в собственные таблицы частот
+def count_shard(shard):
+    filename, start, end, sentences = shard
+    counts = new_counts()
+    try:
+        add_sentences(counts, iter_dataset(filename, start, end) if sentences is None else map(sentence_pairs, sentences))
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("The dataset {} could not be read: {}".format(filename, e))
+    return counts
+
+
+# function for counting the datasets in a pool of worker processes and merging their count tables in the main process, in the order of the shards
+# only a few shards per worker are submitted at a time, so a large json dataset is never entirely in memory
+# функция для подсчета наборов данных в пуле рабочих процессов и объединения их таблиц частот в главном процессе в порядке частей
+# одновременно отправляется лишь несколько частей на процесс, поэтому большой набор данных json никогда не находится в памяти целиком
+def count_datasets(counts, filenames, jobs, shard_size=SHARD_SIZE, shard_sentences=SHARD_SENTENCES):
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    pending = deque()
+
+    def merge_next():
+        filename, future = pending.popleft()
+        merge_counts(counts, future.result())
+        if not any(other == filename for other, _ in pending):
+            print('Counted dataset {}'.format(os.path.basename(filename)))
+            counts["datasets"].append(os.path.basename(filename))
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for filename in filenames:
+            for shard in dataset_shards(filename, shard_size, shard_sentences):
+                pending.append((filename, executor.submit(count_shard, shard)))
+                if len(pending) > 2 * jobs:
+                    merge_next()
+        while pending:
+            merge_next()
+
+
+# functions for saving and loading the count tables; the n-grams are stored as nested dictionaries
+# функции для сохранения и загрузки таблиц частот; n-граммы хранятся во вложенных словарях
+def save_counts(counts, filename):
+    bigrams = {}
+    for (u, v), count in counts["bigrams"].items():
+        bigrams.setdefault(u, {})[v] = count
+    trigrams = {}
+    for (u, v, t), count in counts["trigrams"].items():
+        trigrams.setdefault(u, {}).setdefault(v, {})[t] = count
+    data = {
+        "datasets": counts["datasets"],
+        "words": counts["words"],
+        "unigrams": dict(counts["unigrams"]),
+        "bigrams": bigrams,
+        "trigrams": trigrams,
+    }
+    with open(filename, "w") as outfile:
+        json.dump(data, outfile, indent=4, sort_keys=True, ensure_ascii=False)
+
+
+def load_counts(filename):
+    with open(filename) as json_file:
+        data = json.load(json_file)
+    counts = new_counts()
+    counts["datasets"] = data["datasets"]
+    counts["words"] = data["words"]
+    counts["unigrams"].update(data["unigrams"])
+    for u, vs in data["bigrams"].items():
+        for v, count in vs.items():
+            counts["bigrams"][(u, v)] = count
+    for u, vs in data["trigrams"].items():
+        for v, ts in vs.items():
+            for t, count in ts.items():
+                counts["trigrams"][(u, v, t)] = count
+    return counts
+
+
+# function for deriving the part-of-speech distribution, the emission and the transition probabilities from the count tables
+# функция для вычисления распределения частей речи, вероятностей результата и переходов по таблицам частот
+def derive_probabilities(counts, verbose=False):
+    # totals for each part-of-speech tag (without the sentence start and end tags)
+    # итоги по каждому тегу части речи (без тегов начала и конца предложения)
+    postags = {tag: count for tag, count in counts["unigrams"].items() if tag not in [SENTENCE_PRESTART_TAG, SENTENCE_START_TAG, SENTENCE_END_TAG]}
+
+    # сalculates the emission probabilities for each part-of-speech tag
+    # вычисляет вероятности результата для каждого тега части речи
+    emission_probabilities = {}
+    for k, v in counts["words"].items():
+        total_k = postags[k]
+        for k2, v2 in v.items():
+            emission_probabilities.setdefault(k2, {})[k] = v2 / total_k
+
+    # the transition probabilities are stored sparsely: only the observed trigrams, together with the bigram and unigram probabilities they are interpolated with
+    # вероятности переходов хранятся разреженно: только наблюдаемые триграммы вместе с вероятностями биграмм и униграмм, с которыми они интерполируются
+    targets = {tag: count for tag, count in counts["unigrams"].items() if tag not in [SENTENCE_PRESTART_TAG, SENTENCE_START_TAG]}
+    total = sum(targets.values())
+    unigrams = {t: count / total for t, count in targets.items()}
+    bigrams = {}
+    for (v, t), count in counts["bigrams"].items():
+        if t in targets:
+            bigrams.setdefault(t, {})[v] = count / counts["unigrams"][v]
+
+    # training algorithm for calculating the transition probabilities
+    # обучающий алгоритм расчета вероятностей переходов
+    trigrams = {}
+    for cp_counter, ((u, v, t), count) in enumerate(sorted(counts["trigrams"].items()), 1):
+        probability = count / counts["bigrams"][(u, v)]
+        if verbose:
+            print("[{}] t:{} / u:{} x v:{} = {}".format(cp_counter, t, u, v, probability))
+        trigrams.setdefault(t, {})["{}_{}".format(u, v)] = probability
+    transition_probabilities = {
+        "lambdas": deleted_interpolation(counts, total),
+        "unigrams": unigrams,
+        "bigrams": bigrams,
+        "trigrams": trigrams,
+    }
+    return postags, emission_probabilities, transition_probabilities
+
+
+# function for weighting the trigram, bigram and unigram probabilities by deleted interpolation: every trigram votes, with its count, for the order whose probability is the highest once the trigram itself is removed from the counts
+# функция для взвешивания вероятностей триграмм, биграмм и униграмм методом удаленной интерполяции: каждая триграмма голосует своей частотой за порядок с наибольшей вероятностью после удаления самой триграммы из частот
+def deleted_interpolation(counts, total):
+    lambdas = [0, 0, 0]
+    for (u, v, t), count in counts["trigrams"].items():
+        count_uv = counts["bigrams"][(u, v)]
+        count_vt = counts["bigrams"][(v, t)]
+        count_v = counts["unigrams"][v]
+        trigram = (count - 1) / (count_uv - 1) if count_uv > 1 else 0
+        bigram = (count_vt - 1) / (count_v - 1) if count_v > 1 else 0
+        unigram = (counts["unigrams"][t] - 1) / (total - 1) if total > 1 else 0
+        if trigram >= bigram and trigram >= unigram:
+            lambdas[2] += count
+        elif bigram >= unigram:
+            lambdas[1] += count
+        else:
+            lambdas[0] += count
+    weight = sum(lambdas)
+    return [value / weight for value in lambdas] if weight > 0 else [0, 0, 1]
+
+
+# function for saving the observed trigrams as a table with their probability and the interpolated probability used by the tagger
+# функция для сохранения наблюдаемых триграмм в виде таблицы с их вероятностью и интерполированной вероятностью, используемой теггером
+def write_transition_csv(filename, transition_probabilities):
+    l1, l2, l3 = transition_probabilities["lambdas"]
+    rows = []
+    for t, transitions in transition_probabilities["trigrams"].items():
+        for u_v, probability in transitions.items():
+            u, v = u_v.split("_", 1)
+            interpolated = l1 * transition_probabilities["unigrams"][t] + l2 * transition_probabilities["bigrams"][t][v] + l3 * probability
+            rows.append((u, v, t, probability, interpolated))
+    with open(filename, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file, lineterminator="\n")
+        writer.writerow(["u", "v", "t", "P(t|u,v)", "interpolated"])
+        writer.writerows(sorted(rows))
+
+
+# function for building the binary model in memory directly from the count tables, without writing any file
+# функция для построения двоичной модели в памяти непосредственно по таблицам частот, без записи файлов
+def model_from_counts(counts):
+    postags, emission_probabilities, transition_probabilities = derive_probabilities(counts)
+    return build_model(postags, emission_probabilities, transition_probabilities)
+
+
+# function for deriving the probabilities from the count tables and saving them
+# функция для вычисления вероятностей по таблицам частот и их сохранения
+def write_model_files(counts, data_folder):
+    postags, emission_probabilities, transition_probabilities = derive_probabilities(counts, verbose=True)
+
+    # saves the extracted part-of-speech distribution to a json file
+    # сохраняет извлеченное распределение частей речи в файл json
+    with open(data_folder + "postag_distribution.json", "w") as outfile:
+        json.dump(postags, outfile, indent=4, sort_keys=True)
+
+    # creates a json file to store the emission probabilities
+    # создает файл json для хранения вероятностей результата
+    with open(data_folder + "emission_probabilities.json", "w") as outfile:
+        json.dump(emission_probabilities, outfile, indent=4, sort_keys=True)
+
+    # creates the files with the probabilities
+    # создаются файлы с вероятностей переходов
+    print("Interpolation weights (unigrams, bigrams, trigrams): {}".format(transition_probabilities["lambdas"]))
+    write_transition_csv(data_folder + "transition_probabilities.csv", transition_probabilities)
+    with open(data_folder + "transition_probabilities.json", "w") as outfile:
+        json.dump(transition_probabilities, outfile, indent=4, sort_keys=True)
+
+    # creates the binary model with the same data, which the tagger can open without parsing the json files
+    # создает двоичную модель с теми же данными, которую теггер может открыть без разбора файлов json
+    write_model(data_folder + "model.bin", build_model(postags, emission_probabilities, transition_probabilities))
+
+    # saves the count tables, so the model can be updated with new datasets without training it again
+    # сохраняет таблицы частот, чтобы модель можно было дополнить новыми наборами данных без повторного обучения
+    save_counts(counts, data_folder + "counts.json")
 
 
 
@@ -35,6 +451,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="A part-of-speech Hidden Markov Model trainer")
     parser.add_argument("-r", default=None, type=str, dest="readFrom", help="Full path to the folder containing the training data in json format (it looks into /datasets if the folder is not specified)")
     parser.add_argument("-w", default=None, type=str, dest="writeTo", help="Full path to the folder to save the data obtained from the training set (it saves into /data if the folder is not specified)")
+    parser.add_argument("-u", action="store_true", dest="update", help="Updates the model in the data folder with the datasets that were not used to train it, without asking and without counting the old datasets again")
+    parser.add_argument("-i", default=None, type=str, nargs="+", dest="datasets", help="Dataset files or glob patterns (json or jsonl) to train on without asking; the folder of -r is not scanned")
+    parser.add_argument("-j", default=os.cpu_count(), type=int, dest="jobs", help="Number of worker processes that count the datasets (all the processor cores by default); jsonl datasets are split into shards of their lines and the sentences of json datasets are sent to the processes by batches")
     args = parser.parse_args()
 
     # gets the project's working folder
@@ -45,7 +464,7 @@ if __name__ == "__main__":
     # папка с обучающими данными в формате json 
     dataset_folder = working_folder + "/datasets/" if args.readFrom == None else "{}".format(args.readFrom)
     isExist = os.path.exists(dataset_folder)
-    if not isExist:
+    if not isExist and args.datasets == None:
         raise ValueError("The specified path to the folder containing the json files with the training data does not exists.")
 
  
@@ -57,30 +476,51 @@ if __name__ == "__main__":
         raise ValueError("The specified path to the folder to save the obtained data does not exists. Please, create it manually first.")
 
 
-    # a list for temporary storage of selected datasets // список для временного хранения выбранных наборов данных   
-    training_data = []        
+    # count tables of the model // таблицы частот модели
+    counts_file = data_folder + "counts.json"
+    if args.update:
+        if not os.path.exists(counts_file):
+            raise ValueError("The data folder does not contain the count tables (counts.json) of a trained model. Please, train the model first.")
+        counts = load_counts(counts_file)
+    else:
+        counts = new_counts()
+
+    # a list with the selected dataset files; they are only read while counting // список выбранных файлов наборов данных; они читаются только при подсчете
+    training_data = []
 
-    # load json files // загружается файлы json
-    print('Uploading json files with the training data...')
-    all_files = glob.glob(dataset_folder + '*.json')
+    # datasets given in the command line are used without asking // наборы данных из командной строки используются без вопросов
+    if args.datasets != None:
+        for filename in dataset_files(args.datasets):
+            if os.path.basename(filename) in counts["datasets"]:
+                print('Skipping dataset {}, already counted'.format(os.path.basename(filename)))
+            else:
+                training_data.append(filename)
+        all_files = []
+    else:
+        print('Looking for json files with the training data...')
+        all_files = sorted(glob.glob(dataset_folder + '*.json') + glob.glob(dataset_folder + '*.jsonl'))
     for filename in all_files:
+        dataset_name = os.path.basename(filename)
+        if args.update:
+            # only the datasets that are not in the count tables are added // добавляются только наборы данных, которых нет в таблицах частот
+            if dataset_name in counts["datasets"]:
+                continue
+            response = 'y'
+            print('Adding dataset {}'.format(dataset_name))
+        else:
+            response = None
         user_response = False
         valid_responses = ['y', 'n']
         while user_response == False:
-            response = input('Use dataset {}? [y/n]'.format(filename.split('/')[-1]))
+            if response is None:
+                response = input('Use dataset {}? [y/n]'.format(dataset_name))
             if response in valid_responses:
                 if response == 'y':
-                    try:
-                        with open(filename) as json_file:
-                            data = json.load(json_file)
-                        training_data.append(data)
-                    except Exception as e:
-                        print(e)
-                    else:
-                        print("Training dataset loaded")
+                    training_data.append(filename)
                 user_response = True
             else:
                 print('Response not valid')
+                response = None
 
     # total of selected datasets
     # количество выбранных наборов данных   
@@ -89,121 +529,24 @@ if __name__ == "__main__":
         print('No datasets selected. Exiting script...')
         exit()
 
-    # extracts the pairs worf-form and part-of-speech tags from the training set of sentences
-    # извлекает словоформы и части речи из обучающего набора
-    word_postag_pairs = []
-    postags = {}    # dictionary with totals for each part-of-speech tag / словарь с итогами по каждому тегу части речи
-    total_postags = 0       # total part-of-speech tags / общее количество тегов части речи
-    for x in training_data:
-        content = x['content']
-        for sentence in content:
-            annotations = sentence['parse']
-            l = [(SENTENCE_PRESTART_TAG, SENTENCE_PRESTART_TAG), (SENTENCE_START_TAG, SENTENCE_START_TAG)]
-            for i in annotations:
-                if i['postag'] != 'PNCT':
-                    if i["postag"] not in postags.keys():
-                        postags[i['postag']] = 0
-                    postags[i['postag']] += 1
-                    total_postags += 1
-                    l.append((i['token'], i['postag']))
-            l.append((SENTENCE_END_TAG, SENTENCE_END_TAG))
-            word_postag_pairs.append(l)
-
-    # extracts the distribution of part-of-speechs in the training set
-    # извлекает распределение частей речи в обучающем наборе
-    postag_dist = {}
-    for k, v in postags.items():
-        postag_dist[k] = v / total_postags
-
-    
-    # saves the extracted part-of-speech distribution to a json file
-    # сохраняет извлеченное распределение частей речи в файл json
-    with open(data_folder + "postag_distribution.json", "w") as outfile:
-        json.dump(postags, outfile, indent=4, sort_keys=True)
-
-
-    # list of tuples // список кортежов
-    train_tagged_words = [tup for sent in word_postag_pairs for tup in sent]
-    # set with unique tags form the training set // уникальные теги в обучающих данных
-    tags = {tag for word, tag in train_tagged_words}
-
-
-    # creates a dictionary for storing the frequency word-forms under a specific part-of-speech tag
-    # создает словарь для хранения частотных словоформ под определенной частью речи
-    dictionary = {}
-    for tup in train_tagged_words:
-        token = tup[0].lower()
-        if token not in ["*", "s", "e"]:
-            postag = tup[1]
-            if postag not in dictionary.keys():
-                dictionary[postag] = {}
-            if token not in dictionary[postag].keys():
-                dictionary[postag][token] = 0
-            dictionary[postag][token] += 1
-
-    # сalculates the emission probabilities for each part-of-speech tag
-    # вычисляет вероятности результата для каждого тега части речи
-    emission_probabilities = {}
-    for k, v in dictionary.items():
-        for k2, v2 in v.items():
-            if k2 not in emission_probabilities.keys():
-                emission_probabilities[k2] = {}
-            if k not in emission_probabilities[k2].keys():
-                emission_probabilities[k2][k] = 0
-            emission_probabilities[k2][k] = v2 / postags[k]
-            dictionary[k][k2] = v2 / postags[k]
-
-
-    # creates a json file to store the emission probabilities
-    # создает файл json для хранения вероятностей результата
-    with open(data_folder + "emission_probabilities.json", "w") as outfile:
-        json.dump(emission_probabilities, outfile, indent=4, sort_keys=True)
-
-
-    # prepares the matrix to store the transition emission probabilities
-    # подготавливает матрицу для хранения вероятностей переходов
-    combined_tags = ["{}_{}".format(SENTENCE_PRESTART_TAG, SENTENCE_START_TAG)]
-    for u in list(tags):
-        if u not in [SENTENCE_PRESTART_TAG, SENTENCE_END_TAG]:
-            for v in list(tags):
-                if v not in [SENTENCE_PRESTART_TAG, SENTENCE_START_TAG, SENTENCE_END_TAG]:
-                    comb_tag = "{}_{}".format(u, v)
-                    combined_tags.append(comb_tag)
-    tags.remove(SENTENCE_START_TAG)
-    tags.remove(SENTENCE_PRESTART_TAG)
-    tags_matrix = np.zeros((len(combined_tags), len(tags)), dtype="float32")
-
-
-    # training algorithm for calculating the transition probabilities
-    # обучающий алгоритм расчета вероятностей переходов
-    cp_counter = 1
-    for i, u_v in enumerate(combined_tags):
-        for j, t in enumerate(list(tags)):
-            uv = u_v.split("_")
+    # streams the pairs word-form and part-of-speech tag of the selected datasets into the count tables, one sentence at a time
+    # передает словоформы и части речи выбранных наборов данных в таблицы частот по одному предложению
+    if args.jobs <= 1:
+        for filename in training_data:
+            print('Counting dataset {}'.format(os.path.basename(filename)))
             try:
-                probability = t_given_uv(t, uv[0], uv[1], train_tagged_words)[0] / (t_given_uv(t, uv[0], uv[1], train_tagged_words)[1])
-            except:
-                probability = 0
-            tags_matrix[i, j] = probability
-            print("[{}] t:{} / u:{} x v:{} = {}".format(cp_counter, t, uv[0], uv[1], probability))
-            cp_counter += 1
-            if probability > 0:
-                tags_matrix[i, j] = probability
-            else:
-                tags_matrix[i, j] = 0.000000001  # a very small probability for non existing combinations // минимальная вероятность для несуществующих комбинаций 
-            tags_df = pd.DataFrame(tags_matrix, columns=list(tags), index=combined_tags)
+                add_sentences(counts, iter_dataset(filename))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError("The dataset {} could not be read: {}".format(filename, e))
+            counts["datasets"].append(os.path.basename(filename))
+    else:
+        # the shards of the datasets are counted by the worker processes and their count tables are added up here
+        # части наборов данных подсчитываются рабочими процессами, а их таблицы частот складываются здесь
+        print('Counting {} dataset(s) in {} worker processes'.format(total_seleted_datasets, args.jobs))
+        count_datasets(counts, training_data, args.jobs)
 
-    
-    # creates the files with the probabilities
-    # создаются файлы с вероятностей переходов
-    tags_df.index = combined_tags
-    print(tags_matrix.shape)
-    print(tags_df)
-    df1_transposed = tags_df.T
-    df_sorted = df1_transposed.sort_index(axis=1)
-    df_sorted_index = df_sorted.sort_index()
-    df_sorted_index.to_csv(data_folder + "transition_probabilities.csv")
-    tags_df.to_json(data_folder + "transition_probabilities.json", indent=4)
+    # derives the probabilities from the count tables and saves the model
+    # вычисляет вероятности по таблицам частот и сохраняет модель
+    write_model_files(counts, data_folder)
 
     print("The training process is finished.")
-